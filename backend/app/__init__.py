@@ -1,24 +1,63 @@
 import os
 import logging
+from concurrent.futures import ThreadPoolExecutor
 from flask import Flask, jsonify
 from flask_sqlalchemy import SQLAlchemy
 from flask_migrate import Migrate
 from flask_jwt_extended import JWTManager
 from flask_cors import CORS
+from sqlalchemy import event
 
 # Set up logging
-logging.basicConfig(level=logging.INFO)
+# LOG_LEVEL=DEBUG turns on the request debugging output
+logging.basicConfig(level=os.environ.get('LOG_LEVEL', 'INFO').upper())
 logger = logging.getLogger(__name__)
 
+# orjson is optional; without it the stdlib JSON provider is used
+try:
+    from app.utils.json_provider import OrjsonProvider
+except ImportError:
+    OrjsonProvider = None
+
 # Initialize extensions
 db = SQLAlchemy()
 migrate = Migrate()
 jwt = JWTManager()
 
+@event.listens_for(db.session, 'after_flush')
+def _mark_needs_commit(session, flush_context):
+    """Remember that the request has flushed writes that still need committing."""
+    session.info['needs_commit'] = True
+
+@event.listens_for(db.session, 'after_commit')
+@event.listens_for(db.session, 'after_rollback')
+def _clear_needs_commit(session):
+    """Forget pending writes once the transaction has ended."""
+    session.info.pop('needs_commit', None)
+
+# Import blueprints once per interpreter; they depend on the extensions above
+from app.routes.auth import auth_bp
+from app.routes.posts import posts_bp
+from app.routes.captions import captions_bp
+from app.routes.health import health_bp
+from app.routes.uploads import uploads_bp
+from app.routes.test import test_bp
+
+# Import simple_captions blueprint with error handling
+try:
+    from app.routes.simple_captions import simple_captions_bp
+except ImportError as e:
+    logger.warning("Could not import simple_captions_bp: %s", e)
+    simple_captions_bp = None
+
 def create_app(config_class=None):
     """Create and configure the Flask application."""
     app = Flask(__name__, static_folder='../static')
     
+    # Encode JSON responses with orjson when it is installed
+    if OrjsonProvider is not None:
+        app.json = OrjsonProvider(app)
+    
     # Load configuration
     if config_class is None:
         # Import here to avoid circular imports
@@ -29,6 +68,20 @@ def create_app(config_class=None):
     
     # Ensure upload folder exists
     os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
+
+    # Thread pool for blocking BLIP inference and Cohere calls
+    app.executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix='captions')
+    # Instagram posts run for minutes, so they get their own pool and never
+    # starve the caption workers; its size caps the posting subprocesses
+    app.instagram_executor = ThreadPoolExecutor(max_workers=app.config['INSTAGRAM_POST_WORKERS'],
+                                                thread_name_prefix='instagram')
+    
+    # Load BLIP in the background so no request blocks on it. A preloading
+    # gunicorn master skips this: forking workers in the middle of the load,
+    # or after torch has started its thread pools, can deadlock them
+    if app.config.get('BLIP_WARM_UP', True):
+        from app.utils.blip_image_processor import warm_up as warm_up_blip
+        warm_up_blip()
     
     # Initialize extensions with app
     db.init_app(app)
@@ -44,6 +97,13 @@ def create_app(config_class=None):
     # Initialize JWT
     jwt.init_app(app)
 
+    # Cache decoded tokens so repeat requests skip signature verification
+    from app.utils.jwt_cache import enable_claims_cache, pin_token_hash
+    enable_claims_cache(jwt)
+
+    # Hash the bearer token once per request for the token-keyed caches
+    app.before_request(pin_token_hash)
+
     # Add JWT error handlers
     @jwt.unauthorized_loader
     def unauthorized_callback(callback):
@@ -72,6 +132,17 @@ def create_app(config_class=None):
             'error': 'token_expired'
         }), 401
 
+    # Commit the request's writes once, before the response is sent
+    @app.after_request
+    def commit_session(response):
+        session = db.session
+        if session.info.pop('needs_commit', False) or session.new or session.dirty or session.deleted:
+            if response.status_code < 400:
+                session.commit()
+            else:
+                session.rollback()
+        return response
+
     # Configure CORS with more options
     CORS(app,
          resources={r"/api/*": {
@@ -82,33 +153,9 @@ def create_app(config_class=None):
          }},
          expose_headers=["Content-Type", "Authorization"])
 
-    # Add CORS headers to all responses
-    @app.after_request
-    def after_request(response):
-        response.headers.add('Access-Control-Allow-Origin', 'http://localhost:3000')
-        response.headers.add('Access-Control-Allow-Headers', 'Content-Type,Authorization')
-        response.headers.add('Access-Control-Allow-Methods', 'GET,PUT,POST,DELETE,OPTIONS')
-        response.headers.add('Access-Control-Allow-Credentials', 'true')
-        return response
-    
     # No scheduler initialization needed
     
     # Register blueprints
-    from app.routes.auth import auth_bp
-    from app.routes.posts import posts_bp
-    from app.routes.captions import captions_bp
-    from app.routes.health import health_bp
-    from app.routes.uploads import uploads_bp
-    from app.routes.test import test_bp
-
-    # Import simple_captions blueprint with error handling
-    try:
-        from app.routes.simple_captions import simple_captions_bp
-        has_simple_captions = True
-    except ImportError as e:
-        print(f"Warning: Could not import simple_captions_bp: {e}")
-        has_simple_captions = False
-
     app.register_blueprint(auth_bp, url_prefix='/api/auth')
     app.register_blueprint(posts_bp, url_prefix='/api/posts')
     app.register_blueprint(captions_bp, url_prefix='/api/captions')
@@ -116,18 +163,19 @@ def create_app(config_class=None):
     app.register_blueprint(test_bp, url_prefix='/api/test')
 
     # Register simple_captions blueprint if available
-    if has_simple_captions:
+    if simple_captions_bp is not None:
         app.register_blueprint(simple_captions_bp, url_prefix='/api/simple-captions')
 
     app.register_blueprint(health_bp, url_prefix='/api/health')
 
-    # Print registered blueprints for debugging
-    print("Registered blueprints:")
-    for blueprint in app.blueprints:
-        print(f"  {blueprint} -> {app.blueprints[blueprint].url_prefix}")
+    if app.debug:
+        logger.debug("Registered blueprints: %s", {name: bp.url_prefix for name, bp in app.blueprints.items()})
     
-    # Create database tables if they don't exist
-    with app.app_context():
+    # Create database tables on demand instead of on every startup
+    @app.cli.command('init-db')
+    def init_db():
+        """Create database tables if they don't exist."""
         db.create_all()
+        print("Database tables created")
     
     return app
\ No newline at end of file
@@ -1,6 +1,8 @@
+import os
 from datetime import datetime, timezone
 from app import db
 from werkzeug.security import generate_password_hash, check_password_hash
+from app.utils.password_cache import clear_password_cache
 
 # Helper function to get current time with timezone
 def get_current_time():
@@ -20,6 +22,12 @@ class User(db.Model):
     
     # Relationship with posts
     posts = db.relationship('Post', backref='user', lazy='dynamic')
+
+    # Case-insensitive unique index used by the login/register lookups; see the
+    # README for creating it on an existing database
+    __table_args__ = (
+        db.Index('ix_users_username_lower', db.func.lower(username), unique=True),
+    )
     
     def __init__(self, username, password, instagram_username=None, instagram_password=None):
         self.username = username
@@ -32,6 +40,7 @@ class User(db.Model):
     def set_password(self, password):
         """Set user password."""
         self.password_hash = generate_password_hash(password)
+        clear_password_cache()
     
     def check_password(self, password):
         """Check if password is correct."""
@@ -63,31 +72,48 @@ class Post(db.Model):
     scheduled_at = db.Column(db.DateTime, nullable=True)
     created_at = db.Column(db.DateTime, default=get_current_time)
     updated_at = db.Column(db.DateTime, default=get_current_time, onupdate=get_current_time)
+
+    # Serves get_posts' user_id filter and newest-first ordering without a sort
+    __table_args__ = (
+        db.Index('ix_post_user_created', user_id, created_at.desc()),
+    )
     
     def __repr__(self):
         return f'<Post {self.id}>'
     
-    def to_dict(self):
-        """Convert post to dictionary."""
+    # Columns read by to_dict(), for queries that skip ORM hydration
+    DICT_COLUMNS = ('id', 'user_id', 'image_path', 'image_description', 'caption',
+                    'post_type', 'is_posted', 'scheduled_at', 'created_at', 'updated_at')
+
+    @classmethod
+    def dict_query(cls):
+        """Return a query selecting only the to_dict() columns."""
+        return cls.query.with_entities(*(getattr(cls, name) for name in cls.DICT_COLUMNS))
+
+    @staticmethod
+    def row_to_dict(row):
+        """Convert a Post or a dict_query() row to a dictionary."""
         # Process image path to make it compatible with frontend
-        image_path = self.image_path
+        image_path = row.image_path
         if image_path:
-            # Extract just the filename from the path
-            import os
             # Replace backslashes with forward slashes for consistency
             image_path = image_path.replace('\\', '/')
             # Just use the basename to avoid path issues
             image_path = os.path.basename(image_path)
 
         return {
-            'id': self.id,
-            'user_id': self.user_id,
+            'id': row.id,
+            'user_id': row.user_id,
             'image_path': image_path,
-            'image_description': self.image_description,
-            'caption': self.caption,
-            'post_type': self.post_type,
-            'is_posted': self.is_posted,
-            'scheduled_at': self.scheduled_at.isoformat() if self.scheduled_at else None,
-            'created_at': self.created_at.isoformat(),
-            'updated_at': self.updated_at.isoformat()
-        }
\ No newline at end of file
+            'image_description': row.image_description,
+            'caption': row.caption,
+            'post_type': row.post_type,
+            'is_posted': row.is_posted,
+            'scheduled_at': row.scheduled_at.isoformat() if row.scheduled_at else None,
+            'created_at': row.created_at.isoformat(),
+            'updated_at': row.updated_at.isoformat()
+        }
+
+    def to_dict(self):
+        """Convert post to dictionary."""
+        return self.row_to_dict(self)
@@ -1,8 +1,15 @@
+import logging
 from flask import Blueprint, request, jsonify
-from flask_jwt_extended import create_access_token, jwt_required, get_jwt_identity
+from flask_jwt_extended import create_access_token, jwt_required
 from werkzeug.security import check_password_hash
 from app import db
 from app.models import User
+from app.utils.current_user import current_user
+from app.utils.jwt_cache import get_user_by_username, invalidate_user
+from app.utils.password_cache import check_password
+
+# Set up logging
+logger = logging.getLogger(__name__)
 
 auth_bp = Blueprint('auth', __name__)
 
@@ -16,7 +23,7 @@ def register():
         return jsonify({'message': 'Missing username or password'}), 400
     
     # Check if user already exists
-    existing_user = User.query.filter_by(username=data['username']).first()
+    existing_user = get_user_by_username(data['username'])
     if existing_user:
         return jsonify({'message': 'Username already exists'}), 409
     
@@ -26,9 +33,10 @@ def register():
         password=data['password']
     )
     
-    # Add user to database
+    # Add user to database; flush to get the id, the request commits on success
     db.session.add(new_user)
-    db.session.commit()
+    db.session.flush()
+    invalidate_user(new_user)
     
     # Generate access token with string identity
     access_token = create_access_token(identity=str(new_user.id))
@@ -52,8 +60,8 @@ def login():
         return jsonify({'message': 'Missing username or password'}), 400
     
     # Check if user exists
-    user = User.query.filter_by(username=data['username']).first()
-    if not user or not user.check_password(data['password']):
+    user = get_user_by_username(data['username'])
+    if not user or not check_password(user, data['password']):
         return jsonify({'message': 'Invalid username or password'}), 401
     
     # Generate access token with string identity
@@ -72,21 +80,7 @@ def login():
 @jwt_required()
 def profile():
     """Get the profile of the logged in user."""
-    try:
-        # Get the identity from the JWT token (should be a string)
-        user_id_str = get_jwt_identity()
-        print(f"JWT identity in profile: {user_id_str}, type: {type(user_id_str)}")
-
-        # Convert to integer for database lookup
-        user_id = int(user_id_str)
-    except (ValueError, TypeError) as e:
-        print(f"Error converting user ID to integer in profile: {e}")
-        return jsonify({'message': f'Invalid user ID format'}), 401
-
-    user = User.query.get(user_id)
-    
-    if not user:
-        return jsonify({'message': 'User not found'}), 404
+    user = current_user()
     
     return jsonify({
         'id': user.id,
@@ -100,20 +94,7 @@ def profile():
 @jwt_required()
 def set_instagram_credentials():
     """Set Instagram credentials for the logged in user."""
-    try:
-        # Get the identity from the JWT token (should be a string)
-        user_id_str = get_jwt_identity()
-
-        # Convert to integer for database lookup
-        user_id = int(user_id_str)
-    except (ValueError, TypeError) as e:
-        print(f"Error converting user ID to integer: {e}")
-        return jsonify({'message': f'Invalid user ID format'}), 401
-
-    user = User.query.get(user_id)
-    
-    if not user:
-        return jsonify({'message': 'User not found'}), 404
+    user = current_user()
     
     data = request.get_json()
     
@@ -123,7 +104,8 @@ def set_instagram_credentials():
     
     # Set Instagram credentials
     user.set_instagram_credentials(data['instagram_username'], data['instagram_password'])
-    db.session.commit()
+    db.session.flush()
+    invalidate_user(user)
     
     return jsonify({
         'message': 'Instagram credentials set successfully',
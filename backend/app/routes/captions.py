@@ -1,53 +1,149 @@
 import os
-import traceback
-from flask import Blueprint, request, jsonify, current_app
-from flask_jwt_extended import jwt_required, get_jwt_identity
+import copy
+import json
+import hashlib
+import logging
+import threading
+import time
+from cachetools import TTLCache
+from flask import Blueprint, request, jsonify, current_app, Response
+from flask_jwt_extended import jwt_required
 from werkzeug.utils import secure_filename
 from app import db
-from app.models import User
 try:
     from app.utils.image_processor import ImageProcessor
 except ImportError:
     ImageProcessor = None
 from app.utils.simple_image_processor import SimpleImageProcessor
-from app.utils.blip_image_processor import BlipImageProcessor
+from app.utils.blip_image_processor import BlipImageProcessor, get_blip_processor
 from app.utils.caption_generator import CaptionGenerator
 from app.utils.mock_caption_generator import MockCaptionGenerator
 from app.utils.direct_cohere_generator import DirectCohereGenerator
+from app.utils.current_user import current_user
+from app.utils.image_files import is_image_name
+
+# Set up logging
+logger = logging.getLogger(__name__)
 
 captions_bp = Blueprint('captions', __name__)
 
+# Seconds to wait for work offloaded to the application thread pool
+BLIP_TIMEOUT = 120
+CAPTION_TIMEOUT = 60
+
+def run_in_executor(func, *args, timeout=None):
+    """Run func on the application thread pool and wait for its result."""
+    return current_app.executor.submit(func, *args).result(timeout=timeout)
+
+# Caption generators keyed by class and API key so their clients are reused
+_generators = {}
+
+def get_generator(generator_class, api_key=None):
+    """Return the shared caption generator for the given class and API key."""
+    key = (generator_class, api_key)
+    generator = _generators.get(key)
+    if generator is None:
+        generator = _generators.setdefault(key, generator_class(api_key))
+    return generator
+
+# Generated captions keyed by generator and description
+_caption_cache = TTLCache(maxsize=1024, ttl=300)
+_caption_cache_lock = threading.Lock()
+
+def generate_captions_cached(generator, description):
+    """Generate captions with suggestions, reusing recent results for the same description."""
+    key = (type(generator), generator.api_key, description)
+    with _caption_cache_lock:
+        captions = _caption_cache.get(key)
+    if captions is None:
+        captions = generator.generate_caption_with_suggestions(description)
+        # Don't keep fallback responses that carry an API error
+        if 'error' not in captions:
+            with _caption_cache_lock:
+                _caption_cache[key] = captions
+    # Every caller gets its own copy, so editing one response can't change
+    # what later requests are served from the cache
+    return copy.deepcopy(captions)
+
+# Cohere-backed caption generators in fallback order; the mock generator is
+# the final fallback and is never skipped
+_CAPTION_STRATEGIES = (DirectCohereGenerator, CaptionGenerator)
+
+# Seconds a failing strategy is skipped before it is tried again
+STRATEGY_COOLDOWN = 30
+_failing_until = {}
+
+def _is_cooling_down(strategy):
+    """Check if a strategy failed recently and should be skipped."""
+    return _failing_until.get(strategy, 0) > time.monotonic()
+
+def _mark_failing(strategy):
+    """Skip a strategy for the next STRATEGY_COOLDOWN seconds."""
+    _failing_until[strategy] = time.monotonic() + STRATEGY_COOLDOWN
+
+def save_and_describe(image_bytes, filename):
+    """Save an uploaded image and describe it with BLIP, returning (image_path, description)."""
+    upload_folder = current_app.config['UPLOAD_FOLDER']
+    image_path = None
+
+    if not _is_cooling_down(BlipImageProcessor):
+        try:
+            image_processor = get_blip_processor(upload_folder)
+            image_path = image_processor.save_image_bytes(image_bytes, filename)
+            logger.debug("Image saved at: %s", image_path)
+
+            description = run_in_executor(image_processor.describe_bytes, image_bytes, timeout=BLIP_TIMEOUT)
+            logger.debug("Generated description with BlipImageProcessor: %s", description)
+            return image_path, description
+        except Exception as e:
+            logger.exception("Error with BlipImageProcessor: %s", e)
+            _mark_failing(BlipImageProcessor)
+
+    # Save the image directly without processing if BLIP didn't get that far
+    if image_path is None:
+        image_path = os.path.join(upload_folder, filename)
+        with open(image_path, 'wb') as f:
+            f.write(image_bytes)
+        logger.debug("Image saved directly at: %s", image_path)
+
+    # Use a default description rather than failing
+    return image_path, "A beautiful image uploaded by the user"
+
+def generate_captions(description):
+    """Generate captions with the first caption strategy that succeeds."""
+    api_key = current_app.config['COHERE_API_KEY']
+
+    for strategy in _CAPTION_STRATEGIES:
+        if _is_cooling_down(strategy):
+            logger.debug("Skipping %s while it is cooling down", strategy.__name__)
+            continue
+
+        try:
+            generator = get_generator(strategy, api_key)
+            captions = run_in_executor(generate_captions_cached, generator, description, timeout=CAPTION_TIMEOUT)
+            logger.debug("Generated captions successfully using %s", strategy.__name__)
+            return captions
+        except Exception as e:
+            logger.warning("%s error: %s", strategy.__name__, e)
+            _mark_failing(strategy)
+
+    # Fall back to the mock generator, which needs no external services
+    logger.debug("Falling back to mock caption generator...")
+    return generate_captions_cached(get_generator(MockCaptionGenerator), description)
+
 def allowed_file(filename):
     """Check if the file has an allowed extension."""
-    ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif'}
-    return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
+    return is_image_name(filename)
 
 @captions_bp.route('/generate', methods=['POST'])
 @jwt_required()
 def generate_caption():
     """Generate captions for an image or text."""
-    try:
-        # Get user ID from JWT token
-        try:
-            # Get the identity from the JWT token (should be a string)
-            user_id_str = get_jwt_identity()
-            print(f"JWT identity: {user_id_str}, type: {type(user_id_str)}")
-
-            # Convert to integer for database lookup
-            try:
-                user_id = int(user_id_str)
-            except (ValueError, TypeError) as e:
-                print(f"Error converting user ID to integer: {e}")
-                return jsonify({'message': f'Invalid user ID format: {user_id_str}'}), 401
-        except Exception as e:
-            print(f"Error getting JWT identity: {e}")
-            return jsonify({'message': f'Authentication error: {str(e)}'}), 401
-
-        # Get user from database
-        user = User.query.get(user_id)
-        if not user:
-            return jsonify({'message': 'User not found'}), 404
+    # Resolve the user outside the catch-all handler below so aborts propagate
+    user = current_user()
+    user_id = user.id
 
+    try:
         # Check if the request contains an image file or text
         if 'image' in request.files:
             try:
@@ -63,69 +159,15 @@ def generate_caption():
                 # Save the image
                 filename = secure_filename(f"{user_id}_{image_file.filename}")
 
-                # Try to use the BLIP image processor (as in a.py)
-                try:
-                    print("Using BlipImageProcessor (as in a.py)...")
-                    image_processor = BlipImageProcessor(current_app.config['UPLOAD_FOLDER'])
-
-                    # Save the image
-                    image_path = image_processor.save_image(image_file, filename)
-                    print(f"Image saved at: {image_path}")
-
-                    # Generate image description using BLIP
-                    description = image_processor.get_image_description(image_path)
-                    print(f"Generated description with BlipImageProcessor: {description}")
-                except Exception as e:
-                    print(f"Error with BlipImageProcessor: {e}")
-                    print(traceback.format_exc())
-
-                    # Try again with BLIP but with a simpler approach
-                    try:
-                        print("Trying BLIP again with a simpler approach...")
-                        # Save the image directly without processing
-                        image_path = os.path.join(current_app.config['UPLOAD_FOLDER'], filename)
-                        os.makedirs(os.path.dirname(image_path), exist_ok=True)
-                        image_file.save(image_path)
-                        print(f"Image saved directly at: {image_path}")
-
-                        # Try to initialize BLIP again
-                        blip_processor = BlipImageProcessor(current_app.config['UPLOAD_FOLDER'])
-                        description = blip_processor.get_image_description(image_path)
-                        print(f"Generated description with second BLIP attempt: {description}")
-                    except Exception as retry_error:
-                        print(f"Error with second BLIP attempt: {retry_error}")
-                        print(traceback.format_exc())
-                        # Use a default description rather than failing
-                        description = "A beautiful image uploaded by the user"
-                        print(f"Using default description: {description}")
+                # Read the upload once; it is saved and described from memory
+                image_bytes = image_file.read()
+                image_path, description = save_and_describe(image_bytes, filename)
 
                 # Generate captions with suggestions
                 try:
-                    # Try with the direct Cohere generator (as in a.py)
-                    try:
-                        print("Attempting to use Direct Cohere API for caption generation (as in a.py)...")
-                        direct_generator = DirectCohereGenerator(current_app.config['COHERE_API_KEY'])
-                        captions = direct_generator.generate_caption_with_suggestions(description)
-                        print(f"Generated captions successfully using Direct Cohere API")
-                    except Exception as direct_error:
-                        print(f"Direct Cohere API error: {direct_error}")
-
-                        # Try with the regular caption generator
-                        try:
-                            print("Falling back to regular Cohere API for caption generation...")
-                            caption_generator = CaptionGenerator(current_app.config['COHERE_API_KEY'])
-                            captions = caption_generator.generate_caption_with_suggestions(description)
-                            print(f"Generated captions successfully using regular Cohere API")
-                        except Exception as cohere_error:
-                            # If Cohere API fails, use the mock generator as fallback
-                            print(f"Cohere API error: {cohere_error}")
-                            print("Falling back to mock caption generator...")
-                            mock_generator = MockCaptionGenerator()
-                            captions = mock_generator.generate_caption_with_suggestions(description)
-                            print(f"Generated captions successfully using mock generator")
+                    captions = generate_captions(description)
                 except Exception as e:
-                    print(f"Error generating captions: {e}")
-                    print(traceback.format_exc())
+                    logger.exception("Error generating captions: %s", e)
                     return jsonify({'message': f'Error generating captions: {str(e)}'}), 500
 
                 return jsonify({
@@ -135,7 +177,7 @@ def generate_caption():
                 }), 200
 
             except Exception as e:
-                print(f"Error processing image: {e}")
+                logger.error("Error processing image: %s", e)
                 return jsonify({'message': f'Error processing image: {str(e)}'}), 500
 
         elif request.json and 'text' in request.json:
@@ -148,31 +190,9 @@ def generate_caption():
 
                 # Generate captions with suggestions
                 try:
-                    # Try with the direct Cohere generator (as in a.py)
-                    try:
-                        print("Attempting to use Direct Cohere API for caption generation from text (as in a.py)...")
-                        direct_generator = DirectCohereGenerator(current_app.config['COHERE_API_KEY'])
-                        captions = direct_generator.generate_caption_with_suggestions(text)
-                        print(f"Generated captions successfully using Direct Cohere API")
-                    except Exception as direct_error:
-                        print(f"Direct Cohere API error: {direct_error}")
-
-                        # Try with the regular caption generator
-                        try:
-                            print("Falling back to regular Cohere API for caption generation from text...")
-                            caption_generator = CaptionGenerator(current_app.config['COHERE_API_KEY'])
-                            captions = caption_generator.generate_caption_with_suggestions(text)
-                            print(f"Generated captions successfully using regular Cohere API")
-                        except Exception as cohere_error:
-                            # If Cohere API fails, use the mock generator as fallback
-                            print(f"Cohere API error: {cohere_error}")
-                            print("Falling back to mock caption generator...")
-                            mock_generator = MockCaptionGenerator()
-                            captions = mock_generator.generate_caption_with_suggestions(text)
-                            print(f"Generated captions successfully using mock generator")
+                    captions = generate_captions(text)
                 except Exception as e:
-                    print(f"Error generating captions from text: {e}")
-                    print(traceback.format_exc())
+                    logger.exception("Error generating captions from text: %s", e)
                     return jsonify({'message': f'Error generating captions: {str(e)}'}), 500
 
                 return jsonify({
@@ -181,46 +201,55 @@ def generate_caption():
                 }), 200
 
             except Exception as e:
-                print(f"Error processing text: {e}")
+                logger.error("Error processing text: %s", e)
                 return jsonify({'message': f'Error processing text: {str(e)}'}), 500
 
         else:
             return jsonify({'message': 'No image or text provided. Please upload an image or provide text.'}), 400
 
     except Exception as e:
-        print(f"Unexpected error in generate_caption: {e}")
+        logger.error("Unexpected error in generate_caption: %s", e)
         return jsonify({'message': f'An unexpected error occurred: {str(e)}'}), 500
 
+# Caption styles are static, so the response body is serialized once
+_STYLES = [
+    {
+        'id': 'casual',
+        'name': 'Casual',
+        'description': 'Relaxed, everyday tone'
+    },
+    {
+        'id': 'formal',
+        'name': 'Formal',
+        'description': 'Professional and polished'
+    },
+    {
+        'id': 'poetic',
+        'name': 'Poetic',
+        'description': 'Artistic and expressive'
+    },
+    {
+        'id': 'humorous',
+        'name': 'Humorous',
+        'description': 'Funny and light-hearted'
+    },
+    {
+        'id': 'inspirational',
+        'name': 'Inspirational',
+        'description': 'Motivational and uplifting'
+    }
+]
+
+_STYLES_BODY = json.dumps(_STYLES).encode('utf-8')
+_STYLES_ETAG = hashlib.md5(_STYLES_BODY).hexdigest()
+
 @captions_bp.route('/styles', methods=['GET'])
-@jwt_required()
 def get_caption_styles():
     """Get available caption styles."""
-    styles = [
-        {
-            'id': 'casual',
-            'name': 'Casual',
-            'description': 'Relaxed, everyday tone'
-        },
-        {
-            'id': 'formal',
-            'name': 'Formal',
-            'description': 'Professional and polished'
-        },
-        {
-            'id': 'poetic',
-            'name': 'Poetic',
-            'description': 'Artistic and expressive'
-        },
-        {
-            'id': 'humorous',
-            'name': 'Humorous',
-            'description': 'Funny and light-hearted'
-        },
-        {
-            'id': 'inspirational',
-            'name': 'Inspirational',
-            'description': 'Motivational and uplifting'
-        }
-    ]
-    
-    return jsonify(styles), 200
\ No newline at end of file
+    if request.if_none_match.contains(_STYLES_ETAG):
+        return '', 304
+
+    response = Response(_STYLES_BODY, mimetype='application/json')
+    response.set_etag(_STYLES_ETAG)
+    response.headers['Cache-Control'] = 'public, max-age=86400'
+    return response
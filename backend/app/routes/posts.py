@@ -1,14 +1,20 @@
 import os
 import logging
+import traceback
 from datetime import datetime
-from flask import Blueprint, request, jsonify, current_app
-from flask_jwt_extended import jwt_required, get_jwt_identity
+from flask import Blueprint, request, jsonify, current_app, Response, stream_with_context
+from flask_jwt_extended import jwt_required
+from sqlalchemy import update
+from sqlalchemy.orm import raiseload
 from werkzeug.security import check_password_hash
 from app import db
-from app.models import User, Post
+from app.models import Post
 from app.utils.image_processor import ImageProcessor
 from app.utils.direct_instagram_poster import post_to_instagram as direct_post_to_instagram
 from app.utils.instagram_poster import InstagramPoster, post_to_instagram_direct
+from app.utils.current_user import current_user, current_user_id
+from app.utils.jwt_cache import get_user
+from app.utils.instagram_queue import QueueFull, submit_instagram_job
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
@@ -16,56 +22,133 @@ logger = logging.getLogger(__name__)
 
 posts_bp = Blueprint('posts', __name__)
 
+# Page sizes for get_posts
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+# Rows fetched from the database cursor per batch while streaming a page
+PAGE_FETCH_SIZE = 50
+
+def _resolve_image(image_path, upload_folder):
+    """
+    Return image_path if the file exists, else the file with the same name in
+    upload_folder if that exists, else None.
+    """
+    for path in (image_path, os.path.join(upload_folder, os.path.basename(image_path))):
+        try:
+            os.stat(path)
+            return path
+        except OSError:
+            continue
+    return None
+
+def _post_to_instagram_job(app, post_id, caption, image_path, username, password):
+    """Post an image to Instagram in the background and mark the post as posted."""
+    # Create a new application context for this thread
+    with app.app_context():
+        try:
+            logger.info(f"Starting Instagram posting in thread for post ID: {post_id}")
+
+            # Check if image_path is None
+            if not image_path:
+                logger.error("Post has no image path")
+                return
+
+            # create_post stores resolved paths, so this is normally one stat
+            full_image_path = _resolve_image(image_path, app.config['UPLOAD_FOLDER'])
+            if not full_image_path:
+                logger.error(f"Image not found at path: {image_path}")
+                return
+
+            # Use the direct Instagram poster (runs in separate process); it
+            # converts the image to Instagram size itself
+            logger.info("Using direct Instagram poster (runs in separate process)")
+            success = direct_post_to_instagram(
+                full_image_path,
+                caption,
+                username,
+                password
+            )
+
+            # Update the post status in the database
+            if success:
+                logger.info(f"Post {post_id} successfully posted to Instagram")
+                # Single UPDATE; the row doesn't need to be loaded first
+                result = db.session.execute(update(Post).where(Post.id == post_id).values(is_posted=True))
+                db.session.commit()
+                if result.rowcount:
+                    logger.info(f"Updated post {post_id} status to posted")
+            else:
+                logger.error(f"Failed to post {post_id} to Instagram")
+        except Exception as thread_error:
+            logger.error(f"Exception in Instagram posting thread: {thread_error}")
+            logger.error(traceback.format_exc())
+
+def _stream_posts_page(rows, limit):
+    """
+    Yield the get_posts JSON body ({"posts": [...], "next": ...}) row by row.
+    limit is None for an unpaginated listing, which never has a next page.
+    """
+    dumps = current_app.json.dumps
+    last_row = None
+    count = 0
+
+    yield '{"posts":['
+    for row in rows:
+        if count:
+            yield ','
+        yield dumps(Post.row_to_dict(row))
+        last_row = row
+        count += 1
+
+    next_cursor = last_row.created_at.isoformat() if limit is not None and count == limit else None
+    yield '],"next":' + dumps(next_cursor) + '}\n'
+
 @posts_bp.route('/', methods=['GET'])
 @jwt_required()
 def get_posts():
-    """Get all posts for the logged in user."""
+    """
+    Get the logged in user's posts, newest first.
+    Without query parameters every post is returned, as clients that don't
+    page (the post history page) expect. Passing ?limit= (default 50, max 200)
+    or ?after=<created_at of the last post on the previous page> returns one
+    page; 'next' then holds the cursor for the following page.
+    """
+    user = current_user()
+    user_id = user.id
+
+    paginated = 'limit' in request.args or 'after' in request.args
     try:
-        # Get the identity from the JWT token (should be a string)
-        user_id_str = get_jwt_identity()
-        print(f"JWT identity: {user_id_str}, type: {type(user_id_str)}")
-
-        # Convert to integer for database lookup
-        user_id = int(user_id_str)
-    except (ValueError, TypeError) as e:
-        print(f"Error converting user ID to integer: {e}")
-        return jsonify({'message': f'Invalid user ID format'}), 401
-
-    user = User.query.get(user_id)
+        limit = min(max(int(request.args.get('limit', DEFAULT_PAGE_SIZE)), 1), MAX_PAGE_SIZE) if paginated else None
+        after = request.args.get('after')
+        after = datetime.fromisoformat(after) if after else None
+    except ValueError:
+        return jsonify({'message': 'Invalid pagination parameters'}), 400
     
-    if not user:
-        return jsonify({'message': 'User not found'}), 404
+    # Get the user's posts, or a page of them
+    # Select only the serialized columns; no Post objects are built
+    query = Post.dict_query().filter(Post.user_id == user_id)
+    if after is not None:
+        query = query.filter(Post.created_at < after)
+    query = query.order_by(Post.created_at.desc())
+    if limit is not None:
+        query = query.limit(limit)
+    rows = query.yield_per(PAGE_FETCH_SIZE)
     
-    # Get all posts for the user
-    posts = Post.query.filter_by(user_id=user_id).order_by(Post.created_at.desc()).all()
-    
-    return jsonify({
-        'posts': [post.to_dict() for post in posts]
-    }), 200
+    # Stream the page so posts are encoded as they arrive from the database
+    return Response(stream_with_context(_stream_posts_page(rows, limit)), 200, mimetype='application/json')
 
 @posts_bp.route('/<int:post_id>', methods=['GET'])
 @jwt_required()
 def get_post(post_id):
     """Get a specific post."""
-    try:
-        # Get the identity from the JWT token (should be a string)
-        user_id_str = get_jwt_identity()
-
-        # Convert to integer for database lookup
-        user_id = int(user_id_str)
-    except (ValueError, TypeError) as e:
-        print(f"Error converting user ID to integer: {e}")
-        return jsonify({'message': f'Invalid user ID format'}), 401
-
-    user = User.query.get(user_id)
-    
-    if not user:
-        return jsonify({'message': 'User not found'}), 404
+    user = current_user()
+    user_id = user.id
     
-    # Get the post
-    post = Post.query.filter_by(id=post_id, user_id=user_id).first()
+    # Get the post; to_dict() needs no relationships, so any lazy load is a bug
+    post = db.session.get(Post, post_id, options=[raiseload('*')])
     
-    if not post:
+    # Posts owned by someone else are reported as missing
+    if not post or post.user_id != user_id:
         return jsonify({'message': 'Post not found'}), 404
     
     return jsonify(post.to_dict()), 200
@@ -74,31 +157,18 @@ def get_post(post_id):
 @jwt_required()
 def create_post():
     """Create a new post."""
-    # Print all headers for debugging
-    print("Request headers:")
-    for header, value in request.headers.items():
-        # Don't print the full token for security reasons
-        if header.lower() == 'authorization':
-            print(f"  {header}: {value[:20]}...")
-        else:
-            print(f"  {header}: {value}")
+    # Log all headers for debugging
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("Request headers:")
+        for header, value in request.headers.items():
+            # Don't log the full token for security reasons
+            if header.lower() == 'authorization':
+                logger.debug("  %s: %s...", header, value[:20])
+            else:
+                logger.debug("  %s: %s", header, value)
 
-    try:
-        # Get the identity from the JWT token (should be a string)
-        user_id_str = get_jwt_identity()
-        print(f"JWT identity: {user_id_str}, type: {type(user_id_str)}")
-
-        # Convert to integer for database lookup
-        user_id = int(user_id_str)
-        print(f"Converted user_id: {user_id}")
-    except (ValueError, TypeError) as e:
-        print(f"Error converting user ID to integer: {e}")
-        return jsonify({'message': f'Invalid user ID format: {str(e)}'}), 401
-
-    user = User.query.get(user_id)
-    
-    if not user:
-        return jsonify({'message': 'User not found'}), 404
+    user = current_user()
+    user_id = user.id
     
     data = request.get_json()
     
@@ -109,18 +179,14 @@ def create_post():
     # Create new post
     image_path = data.get('image_path')
 
-    # If image_path is provided but doesn't exist, try to find it in the upload folder
-    if image_path and not os.path.exists(image_path):
-        # Try to find the image in the upload folder
-        upload_folder = current_app.config['UPLOAD_FOLDER']
-        basename = os.path.basename(image_path) if image_path else None
-        if basename:
-            possible_path = os.path.join(upload_folder, basename)
-            if os.path.exists(possible_path):
-                image_path = possible_path
-                logger.info(f"Found image at: {image_path}")
-            else:
-                logger.warning(f"Image not found at: {possible_path}")
+    # Resolve the image once and store the path that exists, falling back to
+    # the upload folder
+    if image_path:
+        resolved_path = _resolve_image(image_path, current_app.config['UPLOAD_FOLDER'])
+        if resolved_path:
+            image_path = resolved_path
+        else:
+            logger.warning(f"Image not found at: {image_path}")
 
     new_post = Post(
         user_id=user_id,
@@ -156,81 +222,11 @@ def create_post():
             logger.info(f"Posting to Instagram with username: {instagram_credentials['username']}")
 
             try:
-                # Post directly to Instagram using a thread to avoid blocking
-                import threading
-                from flask import current_app
-                import copy
-
-                # Store the post ID and credentials to avoid SQLAlchemy session issues
-                post_id = new_post.id
-                post_caption = new_post.caption
-                post_image_path = new_post.image_path
-                post_type = new_post.post_type
-                username = instagram_credentials['username']
-                password = instagram_credentials['password']
-
-                # Get the current app for the thread
+                # Pass plain values so the job doesn't touch this request's session
                 app = current_app._get_current_object()
-
-                def instagram_posting_thread():
-                    # Create a new application context for this thread
-                    with app.app_context():
-                        try:
-                            logger.info(f"Starting Instagram posting in thread for post ID: {post_id}")
-
-                            # Find the image
-                            import os
-
-                            # Check if post_image_path is None
-                            if not post_image_path:
-                                logger.error("Post has no image path")
-                                return
-
-                            full_image_path = post_image_path
-
-                            # Try to find the image if it doesn't exist
-                            if not os.path.exists(full_image_path):
-                                upload_folder = app.config['UPLOAD_FOLDER']
-                                basename = os.path.basename(post_image_path)
-                                possible_path = os.path.join(upload_folder, basename)
-                                if os.path.exists(possible_path):
-                                    full_image_path = possible_path
-                                    logger.info(f"Found image at: {full_image_path}")
-
-                            if not os.path.exists(full_image_path):
-                                logger.error(f"Image not found at path: {full_image_path}")
-                                return
-
-                            # Use the direct Instagram poster (runs in separate process)
-                            logger.info("Using direct Instagram poster (runs in separate process)")
-                            success = direct_post_to_instagram(
-                                full_image_path,
-                                post_caption,
-                                username,
-                                password
-                            )
-
-                            # Update the post status in the database
-                            if success:
-                                logger.info(f"Post {post_id} successfully posted to Instagram")
-                                from app.models import Post
-                                from app import db
-                                post = Post.query.get(post_id)
-                                if post:
-                                    post.is_posted = True
-                                    db.session.commit()
-                                    logger.info(f"Updated post {post_id} status to posted")
-                            else:
-                                logger.error(f"Failed to post {post_id} to Instagram")
-                        except Exception as thread_error:
-                            logger.error(f"Exception in Instagram posting thread: {thread_error}")
-                            import traceback
-                            logger.error(traceback.format_exc())
-
-                # Start Instagram posting in a background thread
-                instagram_thread = threading.Thread(target=instagram_posting_thread)
-                instagram_thread.daemon = True
-                instagram_thread.start()
+                submit_instagram_job(app, _post_to_instagram_job, app, new_post.id, new_post.caption,
+                                     new_post.image_path, instagram_credentials['username'],
+                                     instagram_credentials['password'])
 
                 # Set status to queued since we're posting in the background
                 instagram_status = True
@@ -239,9 +235,14 @@ def create_post():
                     'post': new_post.to_dict(),
                     'instagram_status': 'queued'
                 }
+            except QueueFull:
+                response_data = {
+                    'message': 'Post created successfully, but the Instagram posting queue is full. Try again shortly.',
+                    'post': new_post.to_dict(),
+                    'instagram_status': 'failed'
+                }
             except Exception as instagram_error:
                 logger.error(f"Exception setting up Instagram posting: {instagram_error}")
-                import traceback
                 logger.error(traceback.format_exc())
                 instagram_status = False
                 response_data = {
@@ -267,16 +268,15 @@ def create_post():
 @jwt_required()
 def update_post(post_id):
     """Update a specific post."""
-    user_id = get_jwt_identity()
-    user = User.query.get(user_id)
-    
-    if not user:
-        return jsonify({'message': 'User not found'}), 404
+    # The post's user_id check below enforces ownership, so the user row
+    # itself is not needed
+    user_id = current_user_id()
     
-    # Get the post
-    post = Post.query.filter_by(id=post_id, user_id=user_id).first()
+    # Get the post from the identity map or by primary key; posts owned by
+    # someone else are reported as missing
+    post = db.session.get(Post, post_id)
     
-    if not post:
+    if not post or post.user_id != user_id:
         return jsonify({'message': 'Post not found'}), 404
     
     data = request.get_json()
@@ -303,16 +303,15 @@ def update_post(post_id):
 @jwt_required()
 def delete_post(post_id):
     """Delete a specific post."""
-    user_id = get_jwt_identity()
-    user = User.query.get(user_id)
-    
-    if not user:
-        return jsonify({'message': 'User not found'}), 404
+    # The post's user_id check below enforces ownership, so the user row
+    # itself is not needed
+    user_id = current_user_id()
     
-    # Get the post
-    post = Post.query.filter_by(id=post_id, user_id=user_id).first()
+    # Get the post from the identity map or by primary key; posts owned by
+    # someone else are reported as missing
+    post = db.session.get(Post, post_id)
     
-    if not post:
+    if not post or post.user_id != user_id:
         return jsonify({'message': 'Post not found'}), 404
     
     # Delete the post from the database
@@ -327,16 +326,13 @@ def delete_post(post_id):
 @jwt_required()
 def post_to_instagram_endpoint(post_id):
     """Post a specific post to Instagram."""
-    user_id = get_jwt_identity()
-    user = User.query.get(user_id)
+    user_id = current_user_id()
 
-    if not user:
-        return jsonify({'message': 'User not found'}), 404
+    # Get the post from the identity map or by primary key; posts owned by
+    # someone else are reported as missing
+    post = db.session.get(Post, post_id)
 
-    # Get the post
-    post = Post.query.filter_by(id=post_id, user_id=user_id).first()
-
-    if not post:
+    if not post or post.user_id != user_id:
         return jsonify({'message': 'Post not found'}), 404
 
     data = request.get_json()
@@ -348,9 +344,12 @@ def post_to_instagram_endpoint(post_id):
     if data and data.get('instagram_credentials'):
         instagram_username = data['instagram_credentials'].get('username')
         instagram_password = data['instagram_credentials'].get('password')
-    elif user.instagram_username:
-        instagram_username = user.instagram_username
-        instagram_password = user.get_instagram_password()
+    else:
+        # Fall back to the saved credentials; the user is only loaded here
+        user = get_user(user_id)
+        if user and user.instagram_username:
+            instagram_username = user.instagram_username
+            instagram_password = user.get_instagram_password()
 
     if not instagram_username or not instagram_password:
         return jsonify({'message': 'Missing Instagram credentials'}), 400
@@ -359,125 +358,23 @@ def post_to_instagram_endpoint(post_id):
     logger.info(f"Posting to Instagram with username: {instagram_username}")
 
     try:
-        # Post directly to Instagram using a thread to avoid blocking
-        import threading
-        from flask import current_app
-
-        # Store the post data to avoid SQLAlchemy session issues
-        post_id_copy = post.id
-        post_caption = post.caption
-        post_image_path = post.image_path
-        post_type = post.post_type
-        username_copy = instagram_username
-        password_copy = instagram_password
-
-        # Get the current app for the thread
+        # Pass plain values so the job doesn't touch this request's session
         app = current_app._get_current_object()
+        submit_instagram_job(app, _post_to_instagram_job, app, post.id, post.caption,
+                             post.image_path, instagram_username, instagram_password)
 
-        def instagram_posting_thread():
-            # Create a new application context for this thread
-            with app.app_context():
-                try:
-                    logger.info(f"Starting Instagram posting in thread for post ID: {post_id_copy}")
-
-                    # Create a direct implementation without using the database
-                    from app.utils.instagram_poster import InstagramPoster
-
-                    # Find the image
-                    import os
-
-                    # Check if post_image_path is None
-                    if not post_image_path:
-                        logger.error("Post has no image path")
-                        return
-
-                    full_image_path = post_image_path
-
-                    # Try to find the image if it doesn't exist
-                    if not os.path.exists(full_image_path):
-                        upload_folder = app.config['UPLOAD_FOLDER']
-                        basename = os.path.basename(post_image_path)
-                        possible_path = os.path.join(upload_folder, basename)
-                        if os.path.exists(possible_path):
-                            full_image_path = possible_path
-                            logger.info(f"Found image at: {full_image_path}")
-
-                    if not os.path.exists(full_image_path):
-                        logger.error(f"Image not found at path: {full_image_path}")
-                        return
-
-                    # Convert image for Instagram
-                    try:
-                        from PIL import Image
-
-                        # Open the image
-                        image = Image.open(full_image_path)
-
-                        # Convert to RGB if needed
-                        if image.mode != 'RGB':
-                            image = image.convert('RGB')
-
-                        # Crop to square
-                        width, height = image.size
-                        min_dim = min(width, height)
-                        left = (width - min_dim) // 2
-                        top = (height - min_dim) // 2
-                        right = left + min_dim
-                        bottom = top + min_dim
-                        image_cropped = image.crop((left, top, right, bottom))
-
-                        # Resize for Instagram
-                        image_resized = image_cropped.resize((1080, 1080), resample=Image.LANCZOS)
-
-                        # Save as JPEG
-                        output_dir = os.path.dirname(full_image_path)
-                        name = os.path.splitext(os.path.basename(full_image_path))[0]
-                        instagram_image_path = os.path.join(output_dir, f"{name}_instagram.jpg")
-                        image_resized.save(instagram_image_path, 'JPEG', quality=95)
-                        logger.info(f"Saved Instagram-sized image to: {instagram_image_path}")
-                    except Exception as img_error:
-                        logger.error(f"Error processing image: {img_error}")
-                        instagram_image_path = full_image_path
-
-                    # Use the direct Instagram poster (runs in separate process)
-                    logger.info("Using direct Instagram poster (runs in separate process)")
-                    success = direct_post_to_instagram(
-                        full_image_path,
-                        post_caption,
-                        username_copy,
-                        password_copy
-                    )
-
-                    # Update the post status in the database
-                    if success:
-                        logger.info(f"Post {post_id_copy} successfully posted to Instagram")
-                        from app.models import Post
-                        from app import db
-                        post = Post.query.get(post_id_copy)
-                        if post:
-                            post.is_posted = True
-                            db.session.commit()
-                            logger.info(f"Updated post {post_id_copy} status to posted")
-                    else:
-                        logger.error(f"Failed to post {post_id_copy} to Instagram")
-                except Exception as thread_error:
-                    logger.error(f"Exception in Instagram posting thread: {thread_error}")
-                    import traceback
-                    logger.error(traceback.format_exc())
-
-        # Start Instagram posting in a background thread
-        instagram_thread = threading.Thread(target=instagram_posting_thread)
-        instagram_thread.daemon = True
-        instagram_thread.start()
-
-        # Return success immediately since we're posting in the background
+        # Return immediately since we're posting in the background
         return jsonify({
             'message': 'Instagram posting has been queued',
             'instagram_status': 'queued'
-        }), 200
+        }), 202
+    except QueueFull:
+        return jsonify({
+            'message': 'Instagram posting queue is full. Try again shortly.',
+            'instagram_status': 'failed'
+        }), 503
     except Exception as e:
         logger.error(f"Error setting up Instagram posting: {e}")
-        import traceback
         logger.error(traceback.format_exc())
         return jsonify({
             'message': 'Failed to start Instagram posting',
@@ -10,8 +10,9 @@ from flask_jwt_extended import jwt_required, get_jwt_identity
 from werkzeug.utils import secure_filename
 from app import db
 from app.models import User
-from app.utils.blip_image_processor import BlipImageProcessor
+from app.utils.blip_image_processor import get_blip_processor
 from app.utils.mock_caption_generator import MockCaptionGenerator
+from app.utils.image_files import is_image_name
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
@@ -19,10 +20,28 @@ logger = logging.getLogger(__name__)
 
 simple_captions_bp = Blueprint('simple_captions', __name__)
 
+# Captions returned when there is nothing to describe or processing fails
+GENERIC_CAPTIONS = (
+    {
+        'text': "A beautiful moment captured in time.",
+        'hashtags': ("#photography", "#moment", "#beautiful"),
+        'style': "casual"
+    },
+    {
+        'text': "Every picture tells a story.",
+        'hashtags': ("#story", "#picture", "#memories"),
+        'style': "inspirational"
+    },
+    {
+        'text': "Life is better with good photos!",
+        'hashtags': ("#goodvibes", "#photooftheday", "#lifestyle"),
+        'style': "funny"
+    }
+)
+
 def allowed_file(filename):
     """Check if the file has an allowed extension."""
-    ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif'}
-    return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
+    return is_image_name(filename)
 
 @simple_captions_bp.route('/generate', methods=['POST'])
 @jwt_required()
@@ -74,16 +93,16 @@ def generate_caption():
                 safe_filename = secure_filename(f"blip_{image_file.filename}")
 
                 try:
-                    # Get file size for logging
-                    image_file.seek(0, os.SEEK_END)
-                    file_size = image_file.tell() / (1024 * 1024)  # Size in MB
-                    image_file.seek(0)  # Reset file pointer
+                    # Read the upload once; the size comes from the bytes
+                    image_bytes = image_file.read()
+                    file_size = len(image_bytes) / (1024 * 1024)  # Size in MB
                     logger.info(f"Processing file: {safe_filename}, Size: {file_size:.2f}MB, Type: {image_file.content_type}")
 
                     # Initialize BLIP processor with error handling
+                    blip_processor = None
                     try:
-                        blip_processor = BlipImageProcessor(current_app.config['UPLOAD_FOLDER'])
-                        image_path = blip_processor.save_image(image_file, safe_filename)
+                        blip_processor = get_blip_processor(current_app.config['UPLOAD_FOLDER'])
+                        image_path = blip_processor.save_image_bytes(image_bytes, safe_filename)
                         logger.info(f"Image saved at: {image_path}")
                     except Exception as e:
                         logger.error(f"Error initializing BLIP or saving image: {e}")
@@ -91,20 +110,18 @@ def generate_caption():
 
                         # Save the image directly as fallback
                         image_path = os.path.join(current_app.config['UPLOAD_FOLDER'], safe_filename)
-                        os.makedirs(os.path.dirname(image_path), exist_ok=True)
-                        image_file.save(image_path)
+                        with open(image_path, 'wb') as f:
+                            f.write(image_bytes)
                         logger.info(f"Image saved directly at: {image_path}")
 
                     # Generate a BLIP description with robust error handling
                     try:
-                        if image_path:
-                            # Try to initialize BLIP again if needed
-                            if 'blip_processor' not in locals() or blip_processor is None:
-                                blip_processor = BlipImageProcessor(current_app.config['UPLOAD_FOLDER'])
-
-                            description = blip_processor.get_image_description(image_path)
-                        else:
-                            description = "An image uploaded by the user"
+                        # Try to initialize BLIP again if needed
+                        if blip_processor is None:
+                            blip_processor = get_blip_processor(current_app.config['UPLOAD_FOLDER'])
+
+                        # Describe the bytes already in memory instead of re-reading the file
+                        description = blip_processor.describe_bytes(image_bytes)
                         logger.info(f"Generated BLIP description: {description}")
                     except Exception as e:
                         logger.error(f"Error generating BLIP description: {e}")
@@ -177,28 +194,9 @@ def generate_caption():
         else:
             # If no image or text provided, return generic captions
             logger.warning("No image or text provided, returning generic captions")
-
-            generic_captions = [
-                {
-                    'text': "A beautiful moment captured in time.",
-                    'hashtags': ["#photography", "#moment", "#beautiful"],
-                    'style': "casual"
-                },
-                {
-                    'text': "Every picture tells a story.",
-                    'hashtags': ["#story", "#picture", "#memories"],
-                    'style': "inspirational"
-                },
-                {
-                    'text': "Life is better with good photos!",
-                    'hashtags': ["#goodvibes", "#photooftheday", "#lifestyle"],
-                    'style': "funny"
-                }
-            ]
-
             return jsonify({
                 'description': "Generic caption",
-                'captions': generic_captions,
+                'captions': GENERIC_CAPTIONS,
                 'fallback': True,
                 'message': 'Using generic captions as no image or text was provided'
             }), 200
@@ -208,27 +206,9 @@ def generate_caption():
         logger.error(traceback.format_exc())
 
         # Return generic captions even on unexpected errors
-        generic_captions = [
-            {
-                'text': "A beautiful moment captured in time.",
-                'hashtags': ["#photography", "#moment", "#beautiful"],
-                'style': "casual"
-            },
-            {
-                'text': "Every picture tells a story.",
-                'hashtags': ["#story", "#picture", "#memories"],
-                'style': "inspirational"
-            },
-            {
-                'text': "Life is better with good photos!",
-                'hashtags': ["#goodvibes", "#photooftheday", "#lifestyle"],
-                'style': "funny"
-            }
-        ]
-
         return jsonify({
             'description': "Generic caption",
-            'captions': generic_captions,
+            'captions': GENERIC_CAPTIONS,
             'fallback': True,
             'message': 'Using generic captions due to an unexpected error'
         }), 200
\ No newline at end of file
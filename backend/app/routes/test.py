@@ -1,6 +1,15 @@
 import os
+import html
+import functools
 import logging
-from flask import Blueprint, render_template, current_app, jsonify, send_from_directory, Response
+from flask import Blueprint, render_template, request, current_app, jsonify, send_file, send_from_directory, Response
+from app.utils.image_files import image_content_type, scan_images
+
+# pybase64 is a SIMD drop-in for the stdlib encoder; fall back when missing
+try:
+    import pybase64 as base64
+except ImportError:
+    import base64
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
@@ -8,6 +17,39 @@ logger = logging.getLogger(__name__)
 
 test_bp = Blueprint('test', __name__)
 
+# Bytes read per base64 chunk; 48 KB is divisible by 3
+BASE64_CHUNK_SIZE = 48 * 1024
+
+# Markup for one image card on the test page, split around the base64 data.
+# Fields are HTML-escaped before they are filled in.
+_CARD_HEAD = """
+        <div class="image-card">
+            <h3>{filename}</h3>
+            <div class="file-info">
+                <p><strong>Path:</strong> {path}</p>
+                <p><strong>Full path:</strong> {full_path}</p>{file_checks}
+            </div>
+            <h4>Image Tests</h4>
+            <p>Standard URL: <a href="http://localhost:5000{url}" target="_blank">View Image</a></p>
+            <img src="http://localhost:5000{url}" alt="{filename}" style="max-width: 100px; max-height: 100px;" onerror="this.onerror=null; this.src='https://placehold.co/300x200?text=Image+Not+Found'; this.nextElementSibling.style.display='block';">
+            <p class="error" style="display:none;">Error loading with standard URL!</p>
+
+            <p>Direct URL: <a href="http://localhost:5000/api/uploads/direct/uploads/{filename}" target="_blank">View Direct Image</a></p>
+            <img src="http://localhost:5000/api/uploads/direct/uploads/{filename}" alt="{filename}" style="max-width: 100px; max-height: 100px;" onerror="this.onerror=null; this.src='https://placehold.co/300x200?text=Image+Not+Found'; this.nextElementSibling.style.display='block';">
+            <p class="error" style="display:none;">Error loading with direct URL!</p>
+
+            <p>Base64 Embedded:</p>
+            <img src="data:image/jpeg;base64,"""
+
+# Access checks shown on each card with ?debug=1
+_CARD_CHECKS = """
+                <p><strong>File exists:</strong> <span class="{exists_class}">{exists}</span></p>
+                <p><strong>File readable:</strong> <span class="{readable_class}">{readable}</span></p>"""
+
+_CARD_TAIL = """" alt="{filename}" style="max-width: 100px; max-height: 100px;">
+        </div>
+        """
+
 @test_bp.route('/images', methods=['GET'])
 def test_images():
     """Test page for images."""
@@ -19,26 +61,23 @@ def test_images():
         return f"Upload folder does not exist: {upload_folder}"
 
     # Get all image files
-    image_files = []
-    for root, dirs, files in os.walk(upload_folder):
-        for file in files:
-            if file.lower().endswith(('.jpg', '.jpeg', '.png', '.gif')):
-                file_path = os.path.join(root, file)
-                relative_path = os.path.relpath(file_path, upload_folder)
-                exists = os.path.exists(file_path)
-                readable = os.access(file_path, os.R_OK)
-
-                image_files.append({
-                    'filename': file,
-                    'path': relative_path,
-                    'full_path': file_path,
-                    'exists': exists,
-                    'readable': readable,
-                    'url': f"/api/uploads/{file}"
-                })
-
-    # Create a simple HTML page
-    html = f"""
+    image_files = [{
+        'filename': entry.name,
+        'path': os.path.relpath(entry.path, upload_folder),
+        'full_path': entry.path,
+        'url': f"/api/uploads/{entry.name}"
+    } for entry in scan_images(upload_folder)]
+
+    # With ?debug=1, report access for each file; directory entries only
+    # exist for files that are there, so existence needs no separate check
+    if request.args.get('debug'):
+        for image in image_files:
+            image['exists'] = True
+            image['readable'] = os.access(image['full_path'], os.R_OK)
+
+    # Create a simple HTML page, streamed so embedded images are encoded a
+    # chunk at a time instead of being held in memory whole
+    header = f"""
     <!DOCTYPE html>
     <html>
     <head>
@@ -56,66 +95,53 @@ def test_images():
     </head>
     <body>
         <h1>Test Images</h1>
-        <p><strong>Upload folder:</strong> {upload_folder}</p>
+        <p><strong>Upload folder:</strong> {html.escape(upload_folder)}</p>
         <p><strong>Upload folder exists:</strong> {os.path.exists(upload_folder)}</p>
         <p><strong>Upload folder is readable:</strong> {os.access(upload_folder, os.R_OK)}</p>
-        <p><strong>Current working directory:</strong> {os.getcwd()}</p>
+        <p><strong>Current working directory:</strong> {html.escape(os.getcwd())}</p>
         <p><strong>Number of image files found:</strong> {len(image_files)}</p>
 
         <h2>Image Files</h2>
         <div class="image-container">
     """
 
-    for image in image_files:
-        html += f"""
-        <div class="image-card">
-            <h3>{image['filename']}</h3>
-            <div class="file-info">
-                <p><strong>Path:</strong> {image['path']}</p>
-                <p><strong>Full path:</strong> {image['full_path']}</p>
-                <p><strong>File exists:</strong> <span class="{'success' if image['exists'] else 'error'}">{image['exists']}</span></p>
-                <p><strong>File readable:</strong> <span class="{'success' if image['readable'] else 'error'}">{image['readable']}</span></p>
-            </div>
-            <h4>Image Tests</h4>
-            <p>Standard URL: <a href="http://localhost:5000{image['url']}" target="_blank">View Image</a></p>
-            <img src="http://localhost:5000{image['url']}" alt="{image['filename']}" style="max-width: 100px; max-height: 100px;" onerror="this.onerror=null; this.src='https://placehold.co/300x200?text=Image+Not+Found'; this.nextElementSibling.style.display='block';">
-            <p class="error" style="display:none;">Error loading with standard URL!</p>
-
-            <p>Direct URL: <a href="http://localhost:5000/api/uploads/direct/uploads/{image['filename']}" target="_blank">View Direct Image</a></p>
-            <img src="http://localhost:5000/api/uploads/direct/uploads/{image['filename']}" alt="{image['filename']}" style="max-width: 100px; max-height: 100px;" onerror="this.onerror=null; this.src='https://placehold.co/300x200?text=Image+Not+Found'; this.nextElementSibling.style.display='block';">
-            <p class="error" style="display:none;">Error loading with direct URL!</p>
+    return Response(_render_image_cards(header, image_files), mimetype='text/html')
 
-            <p>Base64 Embedded:</p>
-            <img src="data:image/jpeg;base64,{get_image_base64(image['full_path'])}" alt="{image['filename']}" style="max-width: 100px; max-height: 100px;">
-        </div>
-        """
+def _render_image_cards(header, image_files):
+    """Yield the test page: the header, one card per image, then the footer."""
+    yield header
 
-    html += """
+    for image in image_files:
+        fields = {key: html.escape(str(value)) for key, value in image.items()}
+        fields['file_checks'] = ''
+        if 'readable' in image:
+            fields['exists_class'] = 'success' if image['exists'] else 'error'
+            fields['readable_class'] = 'success' if image['readable'] else 'error'
+            fields['file_checks'] = _CARD_CHECKS.format_map(fields)
+
+        yield _CARD_HEAD.format_map(fields)
+        yield from iter_image_base64(image['full_path'])
+        yield _CARD_TAIL.format_map(fields)
+
+    yield """
         </div>
     </body>
     </html>
     """
 
-    return html
-
-def get_image_base64(file_path):
-    """Convert an image file to base64 for direct embedding."""
+def iter_image_base64(file_path):
+    """Yield an image file as base64 text for direct embedding, one chunk at a time."""
     try:
-        import base64
-        if os.path.exists(file_path) and os.access(file_path, os.R_OK):
-            with open(file_path, 'rb') as f:
-                image_data = f.read()
-                return base64.b64encode(image_data).decode('utf-8')
-        return ""
+        with open(file_path, 'rb') as f:
+            # Chunks are a multiple of 3 bytes, so no padding appears mid-stream
+            for chunk in iter(functools.partial(f.read, BASE64_CHUNK_SIZE), b''):
+                yield base64.b64encode(chunk).decode('ascii')
     except Exception as e:
         logger.error(f"Error reading image file {file_path}: {e}")
-        return ""
 
 @test_bp.route('/upload', methods=['GET', 'POST'])
 def test_upload():
     """Test page for uploading images."""
-    from flask import request
-
     upload_folder = current_app.config['UPLOAD_FOLDER']
 
     # Handle file upload
@@ -137,7 +163,7 @@ def test_upload():
                 message = f"File uploaded successfully to {file_path}"
 
     # Create a simple HTML page
-    html = f"""
+    page = f"""
     <!DOCTYPE html>
     <html>
     <head>
@@ -169,7 +195,7 @@ def test_upload():
     </html>
     """
 
-    return html
+    return page
 
 @test_bp.route('/direct-image/<path:filename>', methods=['GET'])
 def direct_image(filename):
@@ -179,23 +205,19 @@ def direct_image(filename):
         file_path = os.path.join(upload_folder, filename)
 
         logger.info(f"Attempting to serve direct image: {file_path}")
-        logger.info(f"File exists: {os.path.exists(file_path)}")
-        logger.info(f"File is readable: {os.access(file_path, os.R_OK)}")
-
-        if os.path.exists(file_path) and os.access(file_path, os.R_OK):
-            with open(file_path, 'rb') as f:
-                image_data = f.read()
 
-            # Determine content type based on extension
-            content_type = 'image/jpeg'  # Default
-            if file_path.lower().endswith('.png'):
-                content_type = 'image/png'
-            elif file_path.lower().endswith('.gif'):
-                content_type = 'image/gif'
-
-            return Response(image_data, mimetype=content_type)
-        else:
-            return f"File not found or not readable: {file_path}", 404
+        # Determine content type based on extension
+        content_type = image_content_type(file_path, default='image/jpeg')
+
+        # send_file streams from the file (sendfile under gunicorn)
+        # Conditional and Range requests are answered from the file's mtime/size
+        # A missing or unreadable file raises here; nothing is checked first
+        return send_file(file_path, mimetype=content_type, conditional=True, etag=True,
+                         max_age=current_app.config['UPLOAD_CACHE_MAX_AGE'])
+    except (FileNotFoundError, IsADirectoryError, NotADirectoryError):
+        return f"File not found: {file_path}", 404
+    except PermissionError:
+        return f"File not readable: {file_path}", 403
     except Exception as e:
         logger.error(f"Error serving direct image {filename}: {e}")
         import traceback
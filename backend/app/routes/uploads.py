@@ -1,7 +1,11 @@
+import io
 import os
+import functools
 import logging
 import json
-from flask import Blueprint, send_from_directory, current_app, abort, jsonify
+from flask import Blueprint, Response, request, send_file, send_from_directory, current_app, abort, jsonify
+from PIL import Image, ImageDraw
+from app.utils.image_files import image_content_type, is_image_name, scan_files, scan_images
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
@@ -25,31 +29,25 @@ def list_uploads():
             }), 500
 
         # List all files in the upload folder
-        files = []
-        for root, dirs, filenames in os.walk(upload_folder):
-            for filename in filenames:
-                file_path = os.path.join(root, filename)
-                relative_path = os.path.relpath(file_path, upload_folder)
-                files.append({
-                    'filename': filename,
-                    'path': relative_path,
-                    'full_path': file_path,
-                    'url': f"/api/uploads/{filename}"
-                })
-
-        # Also list all files in the current directory
+        files = [{
+            'filename': entry.name,
+            'path': os.path.relpath(entry.path, upload_folder),
+            'full_path': entry.path,
+            'url': f"/api/uploads/{entry.name}"
+        } for entry in scan_files(upload_folder)]
+
+        # With ?debug=1, also list the images directly in the current directory
+        # (not recursively; the tree holds node_modules and model_cache)
         current_dir = os.getcwd()
-        logger.info(f"Current working directory: {current_dir}")
-
         current_dir_files = []
-        for root, dirs, filenames in os.walk(current_dir):
-            for filename in filenames:
-                if any(filename.endswith(ext) for ext in ['.jpg', '.jpeg', '.png', '.gif']):
-                    file_path = os.path.join(root, filename)
-                    current_dir_files.append({
-                        'filename': filename,
-                        'full_path': file_path
-                    })
+        if request.args.get('debug'):
+            logger.info(f"Current working directory: {current_dir}")
+            with os.scandir(current_dir) as entries:
+                current_dir_files = [{
+                    'filename': entry.name,
+                    'full_path': entry.path
+                } for entry in entries
+                    if entry.is_file() and is_image_name(entry.name)]
 
         return jsonify({
             'upload_folder': upload_folder,
@@ -68,29 +66,31 @@ def list_uploads():
     except Exception as e:
         logger.error(f"Error listing uploads: {e}")
 
+@functools.lru_cache(maxsize=1)
+def _placeholder_bytes():
+    """Render the placeholder JPEG once and reuse the bytes."""
+    # Create a simple placeholder image using PIL, with a white background
+    img = Image.new('RGB', (400, 300), color=(240, 240, 240))
+    d = ImageDraw.Draw(img)
+
+    # Add text
+    d.text((150, 150), "No Image", fill=(0, 0, 0))
+
+    # Save the image to a bytes buffer
+    buf = io.BytesIO()
+    img.save(buf, format='JPEG', optimize=True)
+    return buf.getvalue()
+
 @uploads_bp.route('/placeholder', methods=['GET'])
 def serve_placeholder():
     """Serve a placeholder image."""
     try:
-        # Create a simple placeholder image using PIL
-        from PIL import Image, ImageDraw, ImageFont
-        import io
-
-        # Create a new image with a white background
-        img = Image.new('RGB', (400, 300), color=(240, 240, 240))
-        d = ImageDraw.Draw(img)
-
-        # Add text
-        d.text((150, 150), "No Image", fill=(0, 0, 0))
-
-        # Save the image to a bytes buffer
-        buf = io.BytesIO()
-        img.save(buf, format='JPEG')
-        buf.seek(0)
-
-        # Return the image
-        from flask import Response
-        return Response(buf.getvalue(), mimetype='image/jpeg')
+        response = Response(_placeholder_bytes(), mimetype='image/jpeg')
+        # The placeholder URL never changes content, so browsers may keep it
+        # for a day; misses in serve_upload stay uncached
+        if request.endpoint == 'uploads.serve_placeholder':
+            response.headers['Cache-Control'] = 'public, max-age=86400'
+        return response
     except Exception as e:
         logger.error(f"Error creating placeholder image: {e}")
         import traceback
@@ -105,29 +105,20 @@ def serve_any_image():
         logger.info(f"Serving any image from upload folder: {upload_folder}")
 
         # Find any image file
-        for root, dirs, files in os.walk(upload_folder):
-            for file in files:
-                if file.lower().endswith(('.jpg', '.jpeg', '.png', '.gif')):
-                    file_path = os.path.join(root, file)
-                    logger.info(f"Found image file: {file_path}")
-
-                    # Try to read the file directly
-                    try:
-                        with open(file_path, 'rb') as f:
-                            image_data = f.read()
-
-                        # Determine content type based on extension
-                        content_type = 'image/jpeg'  # Default
-                        if file.lower().endswith('.png'):
-                            content_type = 'image/png'
-                        elif file.lower().endswith('.gif'):
-                            content_type = 'image/gif'
-
-                        from flask import Response
-                        return Response(image_data, mimetype=content_type)
-                    except Exception as file_error:
-                        logger.error(f"Error reading file {file_path}: {file_error}")
-                        continue
+        for entry in scan_images(upload_folder):
+            file_path = entry.path
+            logger.info(f"Found image file: {file_path}")
+
+            # Try to serve the file directly
+            try:
+                # Determine content type based on extension
+                content_type = image_content_type(entry.name, default='image/jpeg')
+
+                # send_file streams from the file (sendfile under gunicorn)
+                return send_file(file_path, mimetype=content_type)
+            except Exception as file_error:
+                logger.error(f"Error reading file {file_path}: {file_error}")
+                continue
 
         # If no image found, abort
         logger.error("No image files found in upload folder")
@@ -152,31 +143,22 @@ def serve_direct(filename):
         file_path = os.path.join(cwd, filename)
         logger.info(f"Looking for file at: {file_path}")
 
-        if os.path.exists(file_path) and os.path.isfile(file_path):
-            logger.info(f"File found: {file_path}")
-
-            # Try to read the file directly
-            try:
-                with open(file_path, 'rb') as f:
-                    file_data = f.read()
-
-                # Determine content type based on extension
-                content_type = 'application/octet-stream'  # Default
-                if file_path.lower().endswith(('.jpg', '.jpeg')):
-                    content_type = 'image/jpeg'
-                elif file_path.lower().endswith('.png'):
-                    content_type = 'image/png'
-                elif file_path.lower().endswith('.gif'):
-                    content_type = 'image/gif'
-
-                from flask import Response
-                return Response(file_data, mimetype=content_type)
-            except Exception as file_error:
-                logger.error(f"Error reading file {file_path}: {file_error}")
-                return f"Error reading file: {str(file_error)}", 500
-        else:
+        # Try to serve the file directly
+        try:
+            # Determine content type based on extension
+            content_type = image_content_type(file_path)
+
+            # send_file streams from the file (sendfile under gunicorn)
+            # Conditional and Range requests are answered from the file's mtime/size
+            # A missing file raises here; nothing is checked first
+            return send_file(file_path, mimetype=content_type, conditional=True, etag=True,
+                             max_age=current_app.config['UPLOAD_CACHE_MAX_AGE'])
+        except (FileNotFoundError, IsADirectoryError, NotADirectoryError):
             logger.error(f"File not found: {file_path}")
             return f"File not found: {file_path}", 404
+        except OSError as file_error:
+            logger.error(f"Error reading file {file_path}: {file_error}")
+            return f"Error reading file: {str(file_error)}", 500
     except Exception as e:
         logger.error(f"Error serving file {filename}: {e}")
         import traceback
@@ -187,14 +169,15 @@ def serve_direct(filename):
 def serve_upload(filename):
     """Serve uploaded files."""
     try:
-        logger.info(f"Serving uploaded file: {filename}")
+        logger.debug("Serving uploaded file: %s", filename)
 
         # Get the current working directory
         cwd = os.getcwd()
-        logger.info(f"Current working directory: {cwd}")
 
-        # Try different paths to find the file
+        # Try different paths to find the file, starting with the configured
+        # upload folder where uploads are saved; the rest only matter on a miss
         possible_paths = [
+            os.path.join(current_app.config['UPLOAD_FOLDER'], filename),
             os.path.join(cwd, 'uploads', filename),  # Try uploads folder in current directory
             os.path.join(cwd, filename),  # Try directly in current directory
             os.path.join(cwd, 'backend', 'uploads', filename),  # Try backend/uploads
@@ -209,31 +192,25 @@ def serve_upload(filename):
         possible_paths.append(os.path.join(cwd, 'backend', basename))
 
         # Log all possible paths
-        logger.info("Trying the following paths:")
-        for path in possible_paths:
-            logger.info(f"  {path} - Exists: {os.path.exists(path)}")
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Trying the following paths:")
+            for path in possible_paths:
+                logger.debug("  %s - Exists: %s", path, os.path.exists(path))
 
-        # Try each path
+        # Try each path; isfile is False for missing paths too
         for file_path in possible_paths:
-            if os.path.exists(file_path) and os.path.isfile(file_path):
-                logger.info(f"File found at: {file_path}")
+            if os.path.isfile(file_path):
+                logger.debug("File found at: %s", file_path)
 
-                # Try to read the file directly
+                # Try to serve the file directly
                 try:
-                    with open(file_path, 'rb') as f:
-                        file_data = f.read()
-
                     # Determine content type based on extension
-                    content_type = 'application/octet-stream'  # Default
-                    if file_path.lower().endswith(('.jpg', '.jpeg')):
-                        content_type = 'image/jpeg'
-                    elif file_path.lower().endswith('.png'):
-                        content_type = 'image/png'
-                    elif file_path.lower().endswith('.gif'):
-                        content_type = 'image/gif'
-
-                    from flask import Response
-                    return Response(file_data, mimetype=content_type)
+                    content_type = image_content_type(file_path)
+
+                    # send_file streams from the file (sendfile under gunicorn)
+                    # Conditional and Range requests are answered from the file's mtime/size
+                    return send_file(file_path, mimetype=content_type, conditional=True, etag=True,
+                                     max_age=current_app.config['UPLOAD_CACHE_MAX_AGE'])
                 except Exception as file_error:
                     logger.error(f"Error reading file {file_path}: {file_error}")
                     # Continue to next path
@@ -242,29 +219,20 @@ def serve_upload(filename):
         uploads_dir = os.path.join(cwd, 'uploads')
         if os.path.exists(uploads_dir) and os.path.isdir(uploads_dir):
             logger.info(f"Looking for any image file in: {uploads_dir}")
-            for root, dirs, files in os.walk(uploads_dir):
-                for file in files:
-                    if file.lower().endswith(('.jpg', '.jpeg', '.png', '.gif')):
-                        file_path = os.path.join(root, file)
-                        logger.info(f"Found image file: {file_path}")
-
-                        # Try to read the file
-                        try:
-                            with open(file_path, 'rb') as f:
-                                file_data = f.read()
-
-                            # Determine content type
-                            content_type = 'image/jpeg'  # Default
-                            if file_path.lower().endswith('.png'):
-                                content_type = 'image/png'
-                            elif file_path.lower().endswith('.gif'):
-                                content_type = 'image/gif'
-
-                            from flask import Response
-                            return Response(file_data, mimetype=content_type)
-                        except Exception as file_error:
-                            logger.error(f"Error reading file {file_path}: {file_error}")
-                            # Continue to next file
+            for entry in scan_images(uploads_dir):
+                file_path = entry.path
+                logger.info(f"Found image file: {file_path}")
+
+                # Try to serve the file
+                try:
+                    # Determine content type based on extension
+                    content_type = image_content_type(file_path, default='image/jpeg')
+
+                    # send_file streams from the file (sendfile under gunicorn)
+                    return send_file(file_path, mimetype=content_type)
+                except Exception as file_error:
+                    logger.error(f"Error reading file {file_path}: {file_error}")
+                    # Continue to next file
 
         # If still not found, return a placeholder image
         logger.error(f"File not found after searching all paths: {filename}")
@@ -2,224 +2,401 @@
 BLIP Image Processor for generating image descriptions.
 This implementation is based on the code in a.py.
 """
+import io
 import os
+import hashlib
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from cachetools import LRUCache
+import torch
 from PIL import Image
 from transformers import BlipProcessor, BlipForConditionalGeneration
+from app.utils.instagram_image import convert_to_instagram_size
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+# Module-level model and processor shared by every BlipImageProcessor
+_PROCESSOR = None
+_MODEL = None
+_MODEL_LOCK = threading.Lock()
+
+# Set once the model has loaded; describe_bytes falls back until then
+_MODEL_READY = threading.Event()
+_WARMUP_THREAD = None
+_WARMUP_LOCK = threading.Lock()
+
+# BlipImageProcessor instances keyed by upload folder
+_INSTANCES = {}
+
+# Generated descriptions keyed by SHA-256 of the image bytes
+_DESCRIPTION_CACHE = LRUCache(maxsize=2048)
+_DESCRIPTION_LOCK = threading.Lock()
+
+# Opt-in: compile the vision encoder and text decoder with torch.compile
+_COMPILE_MODEL = os.environ.get('BLIP_TORCH_COMPILE', 'false').lower() == 'true'
+
+# Concurrent describe requests are coalesced into one generate() call of up to
+# BATCH_SIZE images, waiting at most BATCH_WINDOW seconds for others to arrive
+BATCH_SIZE = 8
+BATCH_WINDOW = 0.025
+_BATCH_QUEUE = queue.Queue()
+_BATCH_THREAD = None
+_BATCH_LOCK = threading.Lock()
+
+# Opt-in: on CPU, quantize the Linear layers' weights to int8
+_QUANTIZE_MODEL = os.environ.get('BLIP_QUANTIZE', 'false').lower() == 'true'
+
+def _configure_torch_threads():
+    """Apply TORCH_NUM_THREADS and keep inter-op work on a single thread."""
+    num_threads = os.environ.get('TORCH_NUM_THREADS')
+    if num_threads:
+        torch.set_num_threads(int(num_threads))
+    try:
+        # Requests already run in parallel on the app's thread pool
+        torch.set_num_interop_threads(1)
+    except RuntimeError:
+        # Only allowed before any inter-op parallel work has started
+        pass
+
+_configure_torch_threads()
+
+def hash_image_bytes(image_bytes):
+    """Return the SHA-256 hex digest of the image bytes."""
+    return hashlib.sha256(image_bytes).hexdigest()
+
+def get_cached_description(image_hash):
+    """Return the description generated earlier for the image hash, or None."""
+    with _DESCRIPTION_LOCK:
+        return _DESCRIPTION_CACHE.get(image_hash)
+
+def cache_description(image_hash, description):
+    """Remember the description generated for the image hash."""
+    with _DESCRIPTION_LOCK:
+        _DESCRIPTION_CACHE[image_hash] = description
+
+def _load_model():
+    """Load the BLIP model and processor once per process."""
+    global _PROCESSOR, _MODEL
+
+    if _PROCESSOR is None or _MODEL is None:
+        with _MODEL_LOCK:
+            if _PROCESSOR is None or _MODEL is None:
+                logger.info("Loading BLIP model directly...")
+                try:
+                    # Use local cache to prevent redownloading
+                    cache_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), "model_cache")
+                    os.makedirs(cache_dir, exist_ok=True)
+
+                    _PROCESSOR = BlipProcessor.from_pretrained(
+                        "Salesforce/blip-image-captioning-base",
+                        cache_dir=cache_dir
+                    )
+                    _MODEL = BlipForConditionalGeneration.from_pretrained(
+                        "Salesforce/blip-image-captioning-base",
+                        cache_dir=cache_dir
+                    )
+                    # Inference only: no dropout, and half precision on a GPU
+                    _MODEL.eval()
+                    if torch.cuda.is_available():
+                        _MODEL = _MODEL.to('cuda', dtype=torch.float16)
+                    elif _QUANTIZE_MODEL:
+                        _MODEL = _quantize_model(_MODEL)
+                    if _COMPILE_MODEL:
+                        _compile_model(_PROCESSOR, _MODEL)
+                    _MODEL_READY.set()
+                    logger.info("BLIP model loaded successfully")
+                except Exception as e:
+                    logger.error("Error loading BLIP model: %s", e)
+                    # Leave the globals unset so the next call retries
+                    _PROCESSOR = None
+                    _MODEL = None
+                    raise
+
+    return _PROCESSOR, _MODEL
+
+def get_blip():
+    """Return the shared BLIP processor and model, loading them on first use."""
+    return _load_model()
+
+def prepare_inputs(processor, model, image):
+    """Preprocess an image into tensors on the model's device and dtype."""
+    inputs = processor(image, return_tensors="pt")
+    device, dtype = model.device, model.dtype
+    return {
+        name: tensor.to(device, dtype) if tensor.is_floating_point() else tensor.to(device)
+        for name, tensor in inputs.items()
+    }
+
+def _quantize_model(model):
+    """
+    Return the model with dynamically quantized int8 Linear layers, or the
+    model unchanged if quantization fails.
+    """
+    try:
+        quantized = torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+        logger.info("BLIP model quantized to int8")
+        return quantized
+    except Exception as e:
+        logger.warning("Quantization failed, running BLIP in fp32: %s", e)
+        return model
+
+def _compile_model(processor, model):
+    """
+    Compile the model's vision encoder and text decoder in place.
+    One caption is generated straight away so compilation happens during
+    warm-up; if it fails the model is left running eagerly.
+    """
+    modules = (model.vision_model, model.text_decoder)
+    try:
+        # The processor always resizes to the same square, so only the
+        # decoder sees changing shapes as the caption grows
+        model.vision_model.forward = torch.compile(model.vision_model.forward)
+        model.text_decoder.forward = torch.compile(model.text_decoder.forward, dynamic=True)
+
+        inputs = prepare_inputs(processor, model, Image.new("RGB", (384, 384)))
+        with torch.inference_mode():
+            model.generate(**inputs, max_length=50, num_beams=1, do_sample=False)
+        logger.info("BLIP model compiled with torch.compile")
+    except Exception as e:
+        logger.warning("torch.compile failed, running BLIP eagerly: %s", e)
+        # Drop the compiled instance attributes so the class forward is used again
+        for module in modules:
+            vars(module).pop('forward', None)
+
+def warm_up():
+    """Start loading the BLIP model on a daemon thread if it isn't loaded or loading."""
+    global _WARMUP_THREAD
+
+    if _MODEL_READY.is_set():
+        return
+    # Not _MODEL_LOCK: the loader holds that for the whole load
+    with _WARMUP_LOCK:
+        if _WARMUP_THREAD is None or not _WARMUP_THREAD.is_alive():
+            _WARMUP_THREAD = threading.Thread(target=_warm_up, name='blip-warmup', daemon=True)
+            _WARMUP_THREAD.start()
+
+def _warm_up():
+    try:
+        _load_model()
+    except Exception:
+        # _load_model already reported the error; the next warm_up() retries
+        pass
+
+def describe_images(images, max_length=50):
+    """Generate descriptions for a list of RGB images in a single batch."""
+    processor, model = _load_model()
+    inputs = prepare_inputs(processor, model, images)
+    with torch.inference_mode():
+        output = model.generate(**inputs, max_length=max_length, num_beams=1, do_sample=False)
+    return processor.batch_decode(output, skip_special_tokens=True)
+
+def describe_image(image):
+    """
+    Generate a description for one RGB image, batched with any other images
+    being described at the same time.
+    """
+    global _BATCH_THREAD
+
+    future = Future()
+    _BATCH_QUEUE.put((image, future))
+    with _BATCH_LOCK:
+        if _BATCH_THREAD is None or not _BATCH_THREAD.is_alive():
+            _BATCH_THREAD = threading.Thread(target=_run_batches, name='blip-batch', daemon=True)
+            _BATCH_THREAD.start()
+    return future.result()
+
+def _run_batches():
+    while True:
+        batch = [_BATCH_QUEUE.get()]
+        deadline = time.monotonic() + BATCH_WINDOW
+        while len(batch) < BATCH_SIZE:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(_BATCH_QUEUE.get(timeout=remaining))
+            except queue.Empty:
+                break
+
+        images, futures = zip(*batch)
+        try:
+            descriptions = describe_images(list(images))
+        except Exception as e:
+            for future in futures:
+                future.set_exception(e)
+        else:
+            for future, description in zip(futures, descriptions):
+                future.set_result(description)
+
+def _reset_after_fork():
+    """Drop loader state a forked child can't use; a loaded model is kept."""
+    global _MODEL_LOCK, _WARMUP_LOCK, _WARMUP_THREAD, _BATCH_QUEUE, _BATCH_LOCK, _BATCH_THREAD
+    _MODEL_LOCK = threading.Lock()
+    _WARMUP_LOCK = threading.Lock()
+    _WARMUP_THREAD = None
+    _BATCH_QUEUE = queue.Queue()
+    _BATCH_LOCK = threading.Lock()
+    _BATCH_THREAD = None
+
+# Workers forked mid-load (gunicorn preload_app) restart the load themselves;
+# register_at_fork only exists on POSIX
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+def get_blip_processor(upload_folder):
+    """Return the shared BlipImageProcessor for the given upload folder."""
+    image_processor = _INSTANCES.get(upload_folder)
+    if image_processor is None:
+        image_processor = _INSTANCES.setdefault(upload_folder, BlipImageProcessor(upload_folder))
+    return image_processor
 
 class BlipImageProcessor:
     """Class for processing images and generating descriptions using the BLIP model."""
-    
-    # Class-level variables to store the model and processor (singleton pattern)
-    _processor = None
-    _model = None
 
     def __init__(self, upload_folder):
         """Initialize the image processor with the upload folder."""
         self.upload_folder = upload_folder
+        # Create the upload folder once rather than on every save
+        os.makedirs(upload_folder, exist_ok=True)
 
-        # Load the BLIP model for image captioning (using singleton pattern)
-        if BlipImageProcessor._processor is None or BlipImageProcessor._model is None:
-            print("Loading BLIP model directly...")
-            try:
-                # Use local cache to prevent redownloading
-                cache_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), "model_cache")
-                os.makedirs(cache_dir, exist_ok=True)
-
-                BlipImageProcessor._processor = BlipProcessor.from_pretrained(
-                    "Salesforce/blip-image-captioning-base",
-                    cache_dir=cache_dir
-                )
-                BlipImageProcessor._model = BlipForConditionalGeneration.from_pretrained(
-                    "Salesforce/blip-image-captioning-base",
-                    cache_dir=cache_dir
-                )
-                print("BLIP model loaded successfully")
-            except Exception as e:
-                print(f"Error loading BLIP model: {e}")
-                # Create dummy processor and model for fallback
-                BlipImageProcessor._processor = None
-                BlipImageProcessor._model = None
-                raise
-
-        # Use the class-level instances
-        self.processor = BlipImageProcessor._processor
-        self.model = BlipImageProcessor._model
+        # The process-wide model loads in the background
+        warm_up()
+
+    @property
+    def processor(self):
+        """The shared BLIP processor, or None while it is loading."""
+        return _PROCESSOR if _MODEL_READY.is_set() else None
+
+    @property
+    def model(self):
+        """The shared BLIP model, or None while it is loading."""
+        return _MODEL if _MODEL_READY.is_set() else None
     
     def save_image(self, image_file, filename):
         """Save the uploaded image to the upload folder with preprocessing for large images."""
-        try:
-            # Ensure the upload folder exists
-            os.makedirs(self.upload_folder, exist_ok=True)
+        return self.save_image_bytes(image_file.read(), filename)
 
+    def save_image_bytes(self, image_bytes, filename):
+        """Save already-read image bytes to the upload folder, resizing very large images."""
+        try:
             # Create the full path
             image_path = os.path.join(self.upload_folder, filename)
 
-            # Save the image
-            image_file.save(image_path)
-            print(f"Image saved successfully at: {image_path}")
-
             # Check if the image is very large and resize it if needed
             try:
-                with Image.open(image_path) as img:
+                with Image.open(io.BytesIO(image_bytes)) as img:
                     # If image is larger than 2000x2000, resize it to prevent memory issues
                     if img.width > 2000 or img.height > 2000:
-                        print(f"Image is very large ({img.width}x{img.height}), resizing for better processing")
+                        logger.info("Image is very large (%dx%d), resizing for better processing", img.width, img.height)
 
-                        # Calculate new dimensions (max 2000px width/height)
-                        ratio = min(2000 / img.width, 2000 / img.height)
-                        new_width = int(img.width * ratio)
-                        new_height = int(img.height * ratio)
-
-                        # Resize and save
-                        resized_img = img.resize((new_width, new_height), Image.LANCZOS)
-                        resized_img.save(image_path)
-                        print(f"Resized image to {new_width}x{new_height} and saved at: {image_path}")
+                        # Let libjpeg decode at a reduced scale that still covers
+                        # 2000px, then shrink in place to fit (max 2000px width/height)
+                        img.draft('RGB', (2000, 2000))
+                        img.thumbnail((2000, 2000), Image.LANCZOS)
+                        img.save(image_path)
+                        logger.info("Resized image to %dx%d and saved at: %s", img.width, img.height, image_path)
+                        return image_path
             except Exception as resize_error:
-                print(f"Warning: Could not check/resize image: {resize_error}")
+                logger.warning("Could not check/resize image: %s", resize_error)
                 # Continue with the original image
 
+            # Save the original bytes
+            with open(image_path, 'wb') as f:
+                f.write(image_bytes)
+            logger.info("Image saved successfully at: %s", image_path)
+
             return image_path
         except Exception as e:
-            print(f"Error saving image: {e}")
+            logger.error("Error saving image: %s", e)
             raise
     
-    def convert_to_instagram_size(self, image_path):
+    def get_image_description(self, image_path):
         """
-        Convert the given image to an Instagram-compatible size by center-cropping it to a square
-        and resizing to 1080x1080.
+        Generate a description of the image using the BLIP model.
+        This implementation is based on the code in a.py.
         """
         try:
-            # Open the image
-            image = Image.open(image_path)
-
-            # Get the image dimensions
-            width, height = image.size
-
-            # Determine the smaller dimension for a center crop
-            min_dim = min(width, height)
-            left = (width - min_dim) // 2
-            top = (height - min_dim) // 2
-            right = left + min_dim
-            bottom = top + min_dim
-
-            # Crop the image to a square
-            image_cropped = image.crop((left, top, right, bottom))
-
-            # Resize to 1080x1080 pixels using LANCZOS resampling filter
-            image_resized = image_cropped.resize((1080, 1080), resample=Image.LANCZOS)
-
-            # Generate a new filename for the converted image
-            filename = os.path.basename(image_path)
-            name, ext = os.path.splitext(filename)
-            new_filename = f"{name}_instagram{ext}"
-
-            # Use the same directory as the original image
-            output_dir = os.path.dirname(image_path)
-            new_path = os.path.join(output_dir, new_filename)
-
-            # Save the resized image
-            image_resized.save(new_path)
+            # Read the image; a missing file is reported by open() itself
+            try:
+                with open(image_path, 'rb') as f:
+                    image_bytes = f.read()
+            except FileNotFoundError:
+                logger.error("Image not found at path: %s", image_path)
+                return "An image that could not be found"
 
-            print(f"Saved Instagram-sized image to: {new_path}")
-            return new_path
+            return self.describe_bytes(image_bytes)
         except Exception as e:
-            print(f"Error converting image to Instagram size: {e}")
-            return image_path
+            logger.error("Error generating BLIP image description: %s", e)
+            return "A beautiful image"
 
-    def get_image_description(self, image_path):
-        """
-        Generate a description of the image using the BLIP model.
-        This implementation is based on the code in a.py.
-        """
+    def _model_inputs(self, image):
+        """Preprocess an image into tensors on the model's device and dtype."""
+        return prepare_inputs(self.processor, self.model, image)
+
+    def describe_bytes(self, image_bytes):
+        """Generate a description of an in-memory image using the BLIP model."""
         try:
-            # Check if the model failed to load
-            if self.processor is None or self.model is None:
-                print("BLIP model not available, using fallback description")
+            # Don't wait for a model that is still loading or failed to load
+            if not _MODEL_READY.is_set():
+                warm_up()
+                logger.info("BLIP model not available yet, using fallback description")
                 return "A beautiful image uploaded by the user"
 
-            # Check if the image exists
-            if not os.path.exists(image_path):
-                print(f"Image not found at path: {image_path}")
-                return "An image that could not be found"
-
-            # Open and convert the image to RGB
-            image = Image.open(image_path).convert("RGB")
+            # Reuse the description of an identical image
+            image_hash = hash_image_bytes(image_bytes)
+            description = get_cached_description(image_hash)
+            if description is not None:
+                logger.info("Using cached BLIP image description: %s", description)
+                return description
 
-            # Resize image if it's too large to prevent memory issues
+            # Open the image; JPEGs are decoded straight to RGB at the smallest
+            # DCT scale that still covers max_size
             max_size = 1000  # Max dimension
+            image = Image.open(io.BytesIO(image_bytes))
+            image.draft('RGB', (max_size, max_size))
+            image = image.convert("RGB")
+
+            # Resize image in place if it's still too large
             if image.width > max_size or image.height > max_size:
-                ratio = min(max_size / image.width, max_size / image.height)
-                new_width = int(image.width * ratio)
-                new_height = int(image.height * ratio)
-                image = image.resize((new_width, new_height), Image.LANCZOS)
-                print(f"Resized image to {new_width}x{new_height} for BLIP processing")
+                image.thumbnail((max_size, max_size), Image.LANCZOS)
+                logger.info("Resized image to %dx%d for BLIP processing", image.width, image.height)
 
             # Process the image and generate a description
             try:
-                inputs = self.processor(image, return_tensors="pt")
+                # Generate the caption greedily, batched with concurrent requests
+                description = describe_image(image)
 
-                # Generate the caption with a timeout
-                output = self.model.generate(**inputs, max_length=50)
-
-                # Decode the output to get the description
-                description = self.processor.decode(output[0], skip_special_tokens=True)
-
-                print(f"Generated BLIP image description: {description}")
+                logger.info("Generated BLIP image description: %s", description)
+                cache_description(image_hash, description)
                 return description
             except Exception as model_error:
-                print(f"Error during BLIP model inference: {model_error}")
+                logger.error("Error during BLIP model inference: %s", model_error)
                 # Try with a smaller image if the first attempt failed
                 if image.width > 500 or image.height > 500:
                     try:
                         smaller_image = image.resize((500, 500), Image.LANCZOS)
-                        inputs = self.processor(smaller_image, return_tensors="pt")
-                        output = self.model.generate(**inputs, max_length=30)
+                        inputs = self._model_inputs(smaller_image)
+                        with torch.inference_mode():
+                            output = self.model.generate(**inputs, max_length=30, num_beams=1, do_sample=False)
                         description = self.processor.decode(output[0], skip_special_tokens=True)
-                        print(f"Generated BLIP description with smaller image: {description}")
+                        logger.info("Generated BLIP description with smaller image: %s", description)
+                        cache_description(image_hash, description)
                         return description
                     except Exception as retry_error:
-                        print(f"Error with smaller image: {retry_error}")
+                        logger.error("Error with smaller image: %s", retry_error)
 
                 return "A beautiful image"
         except Exception as e:
-            print(f"Error generating BLIP image description: {e}")
+            logger.error("Error generating BLIP image description: %s", e)
             return "A beautiful image"
     
     def convert_to_instagram_size(self, image_path):
         """
         Convert the given image to an Instagram-compatible size by center-cropping it to a square
-        and resizing to 1080x1080.
+        and resizing to 1080x1080. The shared converter used by the Instagram posters does the work.
         """
-        try:
-            # Open the image
-            image = Image.open(image_path)
-            
-            # Get the image dimensions
-            width, height = image.size
-            
-            # Determine the smaller dimension for a center crop
-            min_dim = min(width, height)
-            left = (width - min_dim) // 2
-            top = (height - min_dim) // 2
-            right = left + min_dim
-            bottom = top + min_dim
-            
-            # Crop the image to a square
-            image_cropped = image.crop((left, top, right, bottom))
-            
-            # Resize to 1080x1080 pixels using LANCZOS resampling filter
-            image_resized = image_cropped.resize((1080, 1080), resample=Image.LANCZOS)
-            
-            # Generate a new filename for the converted image
-            filename = os.path.basename(image_path)
-            name, ext = os.path.splitext(filename)
-            new_filename = f"{name}_instagram{ext}"
-            new_path = os.path.join(self.upload_folder, new_filename)
-            
-            # Save the resized image
-            image_resized.save(new_path)
-            
-            return new_path
-        except Exception as e:
-            print(f"Error converting image to Instagram size: {e}")
-            return image_path
\ No newline at end of file
+        return convert_to_instagram_size(image_path)
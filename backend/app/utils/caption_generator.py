@@ -1,4 +1,20 @@
-import cohere
+import re
+import functools
+from app.utils.cohere_client import generate_first_line, get_cohere_client, run_concurrently
+from app.utils.caption_prompts import (
+    TOKENS_PER_STYLE, caption_prompt, clean_caption_text, multi_style_prompt, parse_styled_captions
+)
+
+# One match per "Caption N (Style):" block, running up to the next block
+_CAPTION_BLOCK_RE = re.compile(r'^[ \t]*Caption\b([^\n]*)\n?(.*?)(?=^[ \t]*Caption\b|\Z)', re.MULTILINE | re.DOTALL)
+
+# One match per "Field: value" section inside a caption block
+_CAPTION_FIELD_RE = re.compile(
+    r'^[ \t]*(Text|Hashtags|Emojis|Formatting):(.*?)(?=^[ \t]*(?:Text|Hashtags|Emojis|Formatting):|\Z)',
+    re.MULTILINE | re.DOTALL
+)
+
+_STYLE_RE = re.compile(r'\(([^)]*)\)')
 
 class CaptionGenerator:
     """Class for generating captions using the Cohere API."""
@@ -6,8 +22,24 @@ class CaptionGenerator:
     def __init__(self, api_key):
         """Initialize the caption generator with the Cohere API key."""
         self.api_key = api_key
-        self.client = cohere.Client(api_key)
+        self.client = get_cohere_client(api_key)
     
+    def _generate_caption(self, description, style=None):
+        """Generate a single caption from the five-shot prompt, letting API errors propagate."""
+        # Stream the caption and stop reading at the end of its first line
+        return generate_first_line(
+            self.client,
+            model="command",  # or try "command-light"
+            prompt=caption_prompt(description, style),
+            max_tokens=50,
+            temperature=0.7,
+            k=0,
+            p=0.75,
+            frequency_penalty=0.0,
+            presence_penalty=0.0,
+            stop_sequences=["\n"]
+        )
+
     def generate_caption(self, description, style=None):
         """
         Generate a single Instagram caption using Cohere's API with a five-shot prompt.
@@ -19,52 +51,8 @@ class CaptionGenerator:
         Returns:
             str: The generated caption.
         """
-        # Build a five-shot prompt with examples
-        style_instruction = ""
-        if style:
-            style_instruction = f" The caption should be in a {style} style."
-            
-        few_shot_prompt = f"""
-Example 1:
-Image Description: A colorful sunset over the ocean with a small sailboat in the distance.
-Caption: "Sailing into the golden hour. #SunsetMagic"
-
-Example 2:
-Image Description: A close-up shot of a delicious slice of pepperoni pizza with melted cheese.
-Caption: "Cheesy dreams and pizza cravings. #FoodieHeaven"
-
-Example 3:
-Image Description: A bustling city street at night with neon lights and busy crowds.
-Caption: "City lights, big dreams. #UrbanVibes"
-
-Example 4:
-Image Description: A serene mountain landscape covered in snow under a clear blue sky.
-Caption: "Chasing peaks and frozen dreams. #NatureLovers"
-
-Example 5:
-Image Description: A bright and playful picture of a dog running happily in a park.
-Caption: "Pure joy on four legs. #HappyPup"
-
-Now, given the following image description, generate a creative, engaging, and appropriate Instagram caption.{style_instruction}
-
-Image Description: "{description}"
-Caption:"""
-        
         try:
-            response = self.client.generate(
-                model="command",  # or try "command-light"
-                prompt=few_shot_prompt,
-                max_tokens=50,
-                temperature=0.7,
-                k=0,
-                p=0.75,
-                frequency_penalty=0.0,
-                presence_penalty=0.0,
-                stop_sequences=["\n"]
-            )
-            
-            caption = response.generations[0].text.strip()
-            return caption
+            return self._generate_caption(description, style)
         except Exception as e:
             print(f"Error generating caption: {e}")
             return "Check out this amazing photo! #Instagram"
@@ -80,15 +68,28 @@ Caption:"""
         Returns:
             dict: A dictionary containing the generated captions with their styles.
         """
-        styles = ["casual", "formal", "poetic", "humorous", "inspirational"]
-        captions = {}
-        
-        # Generate a caption for each style
-        for style in styles[:num_captions]:
-            caption = self.generate_caption(description, style)
-            captions[style] = caption
-        
-        return captions
+        styles = ["casual", "formal", "poetic", "humorous", "inspirational"][:num_captions]
+
+        # Ask for every style in one request so the five-shot prompt is sent once
+        guides = {style: f"a {style} caption" for style in styles}
+        try:
+            response = self.client.generate(
+                model="command",
+                prompt=multi_style_prompt(description, guides),
+                max_tokens=TOKENS_PER_STYLE * len(styles),
+                temperature=0.7,
+                k=0,
+                p=0.75,
+                frequency_penalty=0.0,
+                presence_penalty=0.0
+            )
+            return parse_styled_captions(response.generations[0].text, guides)
+        except Exception as e:
+            print(f"Error generating captions in one request, generating each style: {e}")
+
+        # Otherwise generate a caption for each style, all at the same time
+        results = run_concurrently(*(functools.partial(self.generate_caption, description, style) for style in styles))
+        return dict(zip(styles, results))
     
     def generate_caption_with_suggestions(self, description):
         """
@@ -218,110 +219,25 @@ Formatting: [formatting suggestions]
             dict: A dictionary containing the parsed captions.
         """
         captions = []
-        current_caption = {}
-        current_section = None
-
-        for line in response_text.split('\n'):
-            line = line.strip()
-
-            if not line:
-                continue
-
-            if line.startswith("Caption"):
-                # Save the previous caption if it exists
-                if current_caption:
-                    captions.append(current_caption)
-
-                # Start a new caption
-                style = "casual"
-                if "(" in line and ")" in line:
-                    style = line.split("(")[1].split(")")[0].lower()
-
-                current_caption = {"style": style}
-                current_section = None
-            elif line.startswith("Text:"):
-                current_section = "text"
-                current_caption["text"] = line[5:].strip()
-            elif line.startswith("Hashtags:"):
-                current_section = "hashtags"
-                hashtags = line[9:].strip()
-                current_caption["hashtags"] = [tag.strip() for tag in hashtags.split() if tag.strip()]
-            elif line.startswith("Emojis:"):
-                current_section = "emojis"
-                emojis = line[7:].strip()
-                current_caption["emojis"] = [emoji.strip() for emoji in emojis if emoji.strip()]
-            elif line.startswith("Formatting:"):
-                current_section = "formatting"
-                current_caption["formatting"] = line[11:].strip()
-            elif current_section:
-                # Append to the current section
-                if current_section == "text":
-                    current_caption["text"] += " " + line
-                elif current_section == "hashtags":
-                    hashtags = [tag.strip() for tag in line.split() if tag.strip()]
-                    if "hashtags" in current_caption:
-                        current_caption["hashtags"].extend(hashtags)
-                    else:
-                        current_caption["hashtags"] = hashtags
-                elif current_section == "emojis":
-                    emojis = [emoji.strip() for emoji in line if emoji.strip()]
-                    if "emojis" in current_caption:
-                        current_caption["emojis"].extend(emojis)
-                    else:
-                        current_caption["emojis"] = emojis
-                elif current_section == "formatting":
-                    current_caption["formatting"] += " " + line
-
-        # Add the last caption if it exists
-        if current_caption:
-            captions.append(current_caption)
-
-        # Clean up caption text by removing prefixes like "Here's a reflective caption:" or "Sure, how about:"
-        for caption in captions:
-            if "text" in caption:
-                # List of prefixes to remove
-                prefixes_to_remove = [
-                    "Here's a reflective and thoughtful Instagram caption:",
-                    "Here's a reflective caption:",
-                    "Here's a thoughtful caption:",
-                    "Here's a humorous caption:",
-                    "Here's a casual caption:",
-                    "Here's a poetic caption:",
-                    "Here's an Instagram caption:",
-                    "Sure, how about:",
-                    "How about:",
-                    "I suggest:",
-                    "Try this:",
-                    "Here is a simple & lighthearted Instagram caption idea:",
-                    "Here's a simple caption:",
-                    "Here's a lighthearted caption:",
-                    "Here's a simple & lighthearted caption:",
-                    "Caption:"
-                ]
-
-                for prefix in prefixes_to_remove:
-                    if caption["text"].startswith(prefix):
-                        caption["text"] = caption["text"][len(prefix):].strip()
-
-                # Remove any "Caption:" prefix that might be in the text
-                if caption["text"].startswith("Caption:"):
-                    caption["text"] = caption["text"][8:].strip()
-
-                # Remove quotes if they wrap the entire caption
-                text = caption["text"]
-                if (text.startswith('"') and text.endswith('"')) or (text.startswith("'") and text.endswith("'")):
-                    caption["text"] = text[1:-1].strip()
-
-                # Remove any CSS-like code that might appear in the text
-                if ";position:absolute;" in caption["text"] or ";position:abso/ute;" in caption["text"]:
-                    # Find the position of the CSS code and remove it
-                    css_start = caption["text"].find(";position:")
-                    if css_start > 0:
-                        css_end = caption["text"].find("}", css_start)
-                        if css_end > css_start:
-                            caption["text"] = caption["text"][:css_start] + caption["text"][css_end+1:]
-                        else:
-                            # If we can't find the closing brace, just take the text before the CSS
-                            caption["text"] = caption["text"][:css_start]
 
-        return {"captions": captions}
\ No newline at end of file
+        for block in _CAPTION_BLOCK_RE.finditer(response_text):
+            # The style is given in parentheses on the "Caption N (Style):" line
+            style = _STYLE_RE.search(block.group(1))
+            caption = {"style": style.group(1).lower() if style else "casual"}
+
+            for field in _CAPTION_FIELD_RE.finditer(block.group(2)):
+                name, value = field.group(1), field.group(2)
+                if name == "Text":
+                    # Lines of a wrapped caption are joined with single spaces
+                    caption["text"] = clean_caption_text(" ".join(value.split()))
+                elif name == "Hashtags":
+                    caption["hashtags"] = value.split()
+                elif name == "Emojis":
+                    # Split on whitespace so multi-codepoint emojis stay whole
+                    caption["emojis"] = value.split()
+                else:
+                    caption["formatting"] = " ".join(value.split())
+
+            captions.append(caption)
+
+        return {"captions": captions}
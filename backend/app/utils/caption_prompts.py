@@ -0,0 +1,142 @@
+"""
+Prompt text and response parsing shared by the Cohere caption generators.
+"""
+import json
+import re
+
+# Five-shot examples that prefix every caption prompt
+FEW_SHOT_EXAMPLES = """
+Example 1:
+Image Description: A colorful sunset over the ocean with a small sailboat in the distance.
+Caption: "Sailing into the golden hour. #SunsetMagic"
+
+Example 2:
+Image Description: A close-up shot of a delicious slice of pepperoni pizza with melted cheese.
+Caption: "Cheesy dreams and pizza cravings. #FoodieHeaven"
+
+Example 3:
+Image Description: A bustling city street at night with neon lights and busy crowds.
+Caption: "City lights, big dreams. #UrbanVibes"
+
+Example 4:
+Image Description: A serene mountain landscape covered in snow under a clear blue sky.
+Caption: "Chasing peaks and frozen dreams. #NatureLovers"
+
+Example 5:
+Image Description: A bright and playful picture of a dog running happily in a park.
+Caption: "Pure joy on four legs. #HappyPup"
+"""
+
+# Everything in a single-caption prompt before the style and description
+_FEW_SHOT_PREFIX = FEW_SHOT_EXAMPLES + """
+Now, given the following image description, generate a creative, engaging, and appropriate Instagram caption."""
+
+# Sentence appended to the instruction for each known caption style
+STYLE_INSTRUCTIONS = {
+    style: f" The caption should be in a {style} style."
+    for style in ("casual", "formal", "poetic", "humorous", "inspirational")
+}
+
+# Lead-ins the model sometimes puts before a caption, longest first
+PREFIXES_TO_REMOVE = tuple(sorted((
+    "Here's a reflective and thoughtful Instagram caption:",
+    "Here's a reflective caption:",
+    "Here's a thoughtful caption:",
+    "Here's a humorous caption:",
+    "Here's a casual caption:",
+    "Here's a poetic caption:",
+    "Here's an Instagram caption:",
+    "Sure, how about:",
+    "How about:",
+    "I suggest:",
+    "Try this:",
+    "Here is a simple & lighthearted Instagram caption idea:",
+    "Here's a simple caption:",
+    "Here's a lighthearted caption:",
+    "Here's a simple & lighthearted caption:",
+    "Caption:"
+), key=len, reverse=True))
+
+# One alternation over every lead-in, so a caption is scanned once; repeated
+# lead-ins such as "Sure, how about: Caption:" are stripped together
+_PREFIX_RE = re.compile(r'^(?:(?:' + '|'.join(map(re.escape, PREFIXES_TO_REMOVE)) + r')\s*)+', re.IGNORECASE)
+
+# Matching quotes wrapped around the whole caption
+_QUOTE_RE = re.compile(r'^(["\'])(.*)\1$', re.DOTALL)
+
+# Tokens allowed per style when several captions come back in one response
+TOKENS_PER_STYLE = 60
+
+def caption_prompt(description, style=None):
+    """Build the five-shot prompt for a single caption, optionally in a given style."""
+    style_instruction = STYLE_INSTRUCTIONS.get(style)
+    if style_instruction is None:
+        style_instruction = f" The caption should be in a {style} style." if style else ""
+    return "".join((_FEW_SHOT_PREFIX, style_instruction, '\n\nImage Description: "', description, '"\nCaption:'))
+
+def multi_style_prompt(description, styles):
+    """
+    Build one prompt asking for a caption in every style at once.
+
+    Args:
+        description (str): The image description.
+        styles (dict): Maps each style name to a short description of that style.
+
+    Returns:
+        str: The prompt; the model is asked to answer with a JSON object.
+    """
+    style_lines = "\n".join(f"- {style}: {guide}" for style, guide in styles.items())
+    example = ", ".join(f'"{style}": "..."' for style in styles)
+    return f"""{FEW_SHOT_EXAMPLES}
+Now, given the following image description, generate a creative, engaging, and appropriate Instagram caption in each of these styles:
+{style_lines}
+
+Return ONLY a JSON object mapping each style to its caption, like {{{example}}}.
+
+Image Description: "{description}"
+JSON:"""
+
+def parse_styled_captions(response_text, styles):
+    """
+    Extract the {style: caption} object from a multi-style response.
+
+    Raises:
+        ValueError: If the response holds no JSON object with a caption for every style.
+    """
+    start = response_text.find("{")
+    end = response_text.rfind("}")
+    if start == -1 or end < start:
+        raise ValueError("No JSON object in caption response")
+
+    captions = json.loads(response_text[start:end + 1])
+    if not isinstance(captions, dict):
+        raise ValueError("Caption response is not a JSON object")
+
+    missing = [style for style in styles if not isinstance(captions.get(style), str)]
+    if missing:
+        raise ValueError(f"Caption response is missing styles: {', '.join(missing)}")
+    return {style: captions[style].strip() for style in styles}
+
+def clean_caption_text(caption_text):
+    """Strip lead-ins, wrapping quotes and stray CSS from a generated caption."""
+    # Remove prefixes
+    caption_text = _PREFIX_RE.sub('', caption_text, count=1).strip()
+
+    # Remove quotes if they wrap the entire caption
+    match = _QUOTE_RE.match(caption_text)
+    if match:
+        caption_text = match.group(2).strip()
+
+    # Remove any CSS-like code that might appear in the text
+    if ";position:absolute;" in caption_text or ";position:abso/ute;" in caption_text:
+        # Find the position of the CSS code and remove it
+        css_start = caption_text.find(";position:")
+        if css_start > 0:
+            css_end = caption_text.find("}", css_start)
+            if css_end > css_start:
+                caption_text = caption_text[:css_start] + caption_text[css_end+1:]
+            else:
+                # If we can't find the closing brace, just take the text before the CSS
+                caption_text = caption_text[:css_start]
+
+    return caption_text
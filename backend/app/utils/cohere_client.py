@@ -0,0 +1,131 @@
+"""
+Shared Cohere clients.
+One client is kept per API key, and each client sends its requests over a
+single long-lived requests.Session, so TCP and TLS connections are kept alive
+and reused across requests. Independent Cohere calls made for one caption
+request can be issued side by side with run_concurrently().
+"""
+import json as jsonlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import cohere
+import requests
+from cohere.error import CohereAPIError, CohereConnectionError, CohereError
+from requests.adapters import HTTPAdapter
+from urllib3 import Retry
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+# Threads waiting on Cohere round-trips; separate from the application pool
+# so calls made from a pooled task can't starve it
+REQUEST_POOL_SIZE = 16
+_request_pool = ThreadPoolExecutor(max_workers=REQUEST_POOL_SIZE, thread_name_prefix='cohere')
+
+# Keep-alive connections per client: the request pool plus calls made
+# directly from the application thread pool
+CONNECTION_POOL_SIZE = 32
+
+class PooledCohereClient(cohere.Client):
+    """
+    cohere.Client that reuses one Session for every request.
+    The stock 4.x client opens a new Session, and with it a new connection,
+    for each call; _request below is otherwise the same.
+    """
+
+    def __init__(self, *args, **kwargs):
+        # Set up before Client.__init__, which checks the API key with a request
+        self._session = requests.Session()
+        retries = Retry(
+            total=kwargs.get('max_retries', 3),
+            backoff_factor=0.5,
+            allowed_methods=["POST", "GET"],
+            status_forcelist=cohere.RETRY_STATUS_CODES,
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=CONNECTION_POOL_SIZE, max_retries=retries)
+        self._session.mount("https://", adapter)
+        self._session.mount("http://", adapter)
+        super().__init__(*args, **kwargs)
+
+    def _request(self, endpoint, json=None, method="POST", stream=False):
+        headers = {
+            "Authorization": "BEARER {}".format(self.api_key),
+            "Content-Type": "application/json",
+            "Request-Source": self.request_source,
+        }
+
+        url = f"{self.api_url}/{self.api_version}/{endpoint}"
+        try:
+            response = self._session.request(
+                method, url, headers=headers, json=json, timeout=self.timeout, stream=stream, **self.request_dict
+            )
+        except requests.exceptions.ConnectionError as e:
+            raise CohereConnectionError(str(e)) from e
+        except requests.exceptions.RequestException as e:
+            raise CohereError(f"Unexpected exception ({e.__class__.__name__}): {e}") from e
+
+        # The stock client never checks streamed responses, so an error body
+        # would be read as a stream of empty generations
+        if stream and response.ok:
+            return response
+
+        try:
+            json_response = response.json()
+        except jsonlib.decoder.JSONDecodeError:
+            raise CohereAPIError.from_response(response, message=f"Failed to decode json body: {response.text}")
+        finally:
+            if stream:
+                response.close()
+
+        self._check_response(json_response, response.headers, response.status_code)
+        if stream:
+            raise CohereAPIError.from_response(
+                response, message=f"Unexpected status {response.status_code} for a streamed request"
+            )
+        return json_response
+
+def get_cohere_client(api_key):
+    """Return the shared Cohere client for the given API key."""
+    client = _clients.get(api_key)
+    if client is None:
+        with _clients_lock:
+            client = _clients.get(api_key)
+            if client is None:
+                client = PooledCohereClient(api_key)
+                _clients[api_key] = client
+    return client
+
+def run_concurrently(*calls):
+    """
+    Run each zero-argument callable at the same time and return their results
+    in order. If any call raises, the first exception (in that order) is
+    re-raised.
+    """
+    futures = [_request_pool.submit(call) for call in calls]
+    return [future.result() for future in futures]
+
+def generate_first_line(client, **kwargs):
+    """
+    Stream a generation and return its first line, stripped, as soon as that
+    line is complete instead of waiting for the whole response. Raises
+    CohereError if the stream carries no text.
+    """
+    stream = client.generate(stream=True, **kwargs)
+    parts = []
+    try:
+        for token in stream:
+            if not token.text:
+                continue
+            parts.append(token.text)
+            if '\n' in token.text:
+                break
+    finally:
+        # Release the connection rather than leaving the rest of the stream unread
+        stream.response.close()
+
+    # Treated like an error response, so callers fall back instead of returning ''
+    first_line = ''.join(parts).split('\n', 1)[0].strip()
+    if not first_line:
+        raise CohereError("Cohere stream ended without any generated text")
+    return first_line
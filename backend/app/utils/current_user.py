@@ -0,0 +1,37 @@
+"""
+Resolve the User behind the current request's JWT.
+"""
+import logging
+from flask import abort, jsonify, make_response
+from flask_jwt_extended import get_jwt_identity
+from app.utils.jwt_cache import get_user, parse_user_id
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+def current_user_id():
+    """
+    Return the user id from the current request's JWT identity without loading
+    the User. Aborts with 401 if the identity is not a valid user id.
+    """
+    # Get the identity from the JWT token (should be a string)
+    user_id_str = get_jwt_identity()
+    logger.debug("JWT identity: %s, type: %s", user_id_str, type(user_id_str))
+
+    try:
+        return parse_user_id(user_id_str)
+    except (ValueError, TypeError) as e:
+        logger.error("Error converting user ID to integer: %s", e)
+        abort(make_response(jsonify({'message': 'Invalid user ID format'}), 401))
+
+def current_user():
+    """
+    Return the User for the JWT identity of the current request.
+    Aborts with 401 if the identity is not a valid user id and 404 if the user
+    does not exist. Lookups go through the shared user cache.
+    """
+    user = get_user(current_user_id())
+    if not user:
+        abort(make_response(jsonify({'message': 'User not found'}), 404))
+
+    return user
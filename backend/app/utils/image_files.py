@@ -0,0 +1,77 @@
+"""
+Helpers for finding image files on disk.
+"""
+import os
+
+# Content types of the file extensions treated as images
+IMAGE_TYPES = {
+    '.jpg': 'image/jpeg',
+    '.jpeg': 'image/jpeg',
+    '.png': 'image/png',
+    '.gif': 'image/gif',
+}
+
+IMAGE_EXTENSIONS = frozenset(IMAGE_TYPES)
+
+# Leading bytes of the formats that can be recognised without decoding
+IMAGE_SIGNATURES = {
+    b'\xff\xd8\xff': 'JPEG',
+    b'\x89PNG\r\n\x1a\n': 'PNG',
+}
+
+# Directories never searched for images, on top of hidden ones
+SKIP_DIRS = frozenset({'node_modules', 'model_cache', '__pycache__', 'venv'})
+
+def file_extension(name):
+    """Return the lowercased extension of name, including the dot, or ''."""
+    dot = name.rfind('.')
+    return name[dot:].lower() if dot != -1 else ''
+
+def is_image_name(name):
+    """Return True if name has one of the image extensions."""
+    return file_extension(name) in IMAGE_EXTENSIONS
+
+def image_content_type(name, default='application/octet-stream'):
+    """Return the content type for name based on its extension."""
+    return IMAGE_TYPES.get(file_extension(name), default)
+
+def sniff_image_format(path):
+    """
+    Return 'JPEG' or 'PNG' from the first bytes of the file at path, or None
+    for any other content. Raises OSError if the file can't be read.
+    """
+    with open(path, 'rb') as f:
+        header = f.read(8)
+    for signature, image_format in IMAGE_SIGNATURES.items():
+        if header.startswith(signature):
+            return image_format
+    return None
+
+def scan_images(root):
+    """
+    Yield an os.DirEntry for every image file under root, recursively.
+    File types come from the directory listing itself, so no extra stat calls
+    are made per entry. Symlinks, hidden directories and SKIP_DIRS are not
+    descended into.
+    """
+    with os.scandir(root) as entries:
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                if not entry.name.startswith('.') and entry.name not in SKIP_DIRS:
+                    yield from scan_images(entry.path)
+            elif entry.is_file(follow_symlinks=False) and is_image_name(entry.name):
+                yield entry
+
+def scan_files(root):
+    """
+    Yield an os.DirEntry for every file under root, recursively, like the
+    file lists of os.walk(root): every subdirectory is searched, symlinked
+    directories are listed as directories but not descended into.
+    """
+    with os.scandir(root) as entries:
+        for entry in entries:
+            if entry.is_dir():
+                if not entry.is_symlink():
+                    yield from scan_files(entry.path)
+            else:
+                yield entry
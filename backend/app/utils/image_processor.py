@@ -1,7 +1,13 @@
+import io
 import os
 from PIL import Image
-from transformers import BlipProcessor, BlipForConditionalGeneration
-import torch
+from app.utils.instagram_image import convert_to_instagram_size
+from app.utils.blip_image_processor import (
+    cache_description, describe_image, describe_images, get_blip, get_cached_description, hash_image_bytes
+)
+
+# Chunk size for copying uploads that aren't backed by a file
+COPY_BUFFER_SIZE = 1 << 20
 
 class ImageProcessor:
     """Class for processing images and generating descriptions."""
@@ -9,18 +15,17 @@ class ImageProcessor:
     def __init__(self, upload_folder):
         """Initialize the image processor with the upload folder."""
         self.upload_folder = upload_folder
-        # Load the BLIP model for image captioning
+        # Create the upload folder once rather than on every save
+        os.makedirs(upload_folder, exist_ok=True)
+        # The BLIP model for image captioning is shared with BlipImageProcessor
         self.processor = None
         self.model = None
     
     def _load_model(self):
-        """Lazy load the BLIP model to save resources."""
+        """Use the process-wide BLIP model, loading it on first use."""
         try:
             if self.processor is None or self.model is None:
-                print("Loading BLIP model...")
-                self.processor = BlipProcessor.from_pretrained("Salesforce/blip-image-captioning-base")
-                self.model = BlipForConditionalGeneration.from_pretrained("Salesforce/blip-image-captioning-base")
-                print("BLIP model loaded successfully")
+                self.processor, self.model = get_blip()
         except Exception as e:
             print(f"Error loading BLIP model: {e}")
             # Set to None to indicate loading failed
@@ -31,14 +36,11 @@ class ImageProcessor:
     def save_image(self, image_file, filename):
         """Save the uploaded image to the upload folder."""
         try:
-            # Ensure the upload folder exists
-            os.makedirs(self.upload_folder, exist_ok=True)
-
             # Create the full path
             image_path = os.path.join(self.upload_folder, filename)
 
             # Save the image
-            image_file.save(image_path)
+            self._copy_upload(image_file, image_path)
 
             print(f"Image saved successfully at: {image_path}")
             return image_path
@@ -46,14 +48,56 @@ class ImageProcessor:
             print(f"Error saving image: {e}")
             raise
 
+    @staticmethod
+    def _copy_upload(image_file, image_path):
+        """
+        Write an uploaded FileStorage to image_path. Uploads spooled to a
+        temporary file are copied by the kernel with os.sendfile; in-memory
+        ones are written in 1 MB chunks instead of Werkzeug's 16 KB.
+        """
+        stream = image_file.stream
+        try:
+            src_fd = stream.fileno()
+        except (AttributeError, OSError, ValueError):
+            src_fd = None
+
+        # os.sendfile is POSIX-only; Windows always takes the buffered copy
+        if src_fd is not None and hasattr(os, 'sendfile'):
+            try:
+                offset = stream.tell()
+                remaining = os.fstat(src_fd).st_size - offset
+                with open(image_path, 'wb') as dst:
+                    while remaining > 0:
+                        sent = os.sendfile(dst.fileno(), src_fd, offset, remaining)
+                        if sent == 0:
+                            break
+                        offset += sent
+                        remaining -= sent
+                return
+            except OSError as e:
+                # e.g. a filesystem without sendfile support; copy normally
+                print(f"sendfile failed, falling back to a buffered copy: {e}")
+
+        image_file.save(image_path, buffer_size=COPY_BUFFER_SIZE)
+
     def get_image_description(self, image_path):
         """Generate a description of the image using the BLIP model."""
         try:
-            # Check if the image exists
-            if not os.path.exists(image_path):
+            # Read the image; a missing file is reported by open() itself
+            try:
+                with open(image_path, 'rb') as f:
+                    image_bytes = f.read()
+            except FileNotFoundError:
                 print(f"Image not found at path: {image_path}")
                 return "An image that could not be found"
 
+            # Reuse the description of an identical image
+            image_hash = hash_image_bytes(image_bytes)
+            description = get_cached_description(image_hash)
+            if description is not None:
+                print(f"Using cached image description: {description}")
+                return description
+
             # Try to load the model
             try:
                 self._load_model()
@@ -66,17 +110,11 @@ class ImageProcessor:
                 return "A beautiful image"
 
             # Open and convert the image to RGB
-            image = Image.open(image_path).convert("RGB")
-
-            # Process the image and generate a description
-            inputs = self.processor(image, return_tensors="pt")
+            image = Image.open(io.BytesIO(image_bytes)).convert("RGB")
 
-            # Generate the caption
-            with torch.no_grad():
-                output = self.model.generate(**inputs)
-
-            # Decode the output to get the description
-            description = self.processor.decode(output[0], skip_special_tokens=True)
+            # Generate the caption, batched with any concurrent requests
+            description = describe_image(image)
+            cache_description(image_hash, description)
 
             print(f"Generated image description: {description}")
             return description
@@ -84,41 +122,22 @@ class ImageProcessor:
             print(f"Error generating image description: {e}")
             return "A beautiful image"
     
+    def get_image_descriptions(self, image_paths):
+        """Generate descriptions for several images with a single BLIP batch."""
+        try:
+            self._load_model()
+            images = []
+            for image_path in image_paths:
+                with Image.open(image_path) as image:
+                    images.append(image.convert("RGB"))
+            return describe_images(images)
+        except Exception as e:
+            print(f"Error generating image descriptions: {e}")
+            return ["A beautiful image"] * len(image_paths)
+
     def convert_to_instagram_size(self, image_path):
         """
         Convert the given image to an Instagram-compatible size by center-cropping it to a square
-        and resizing to 1080x1080.
+        and resizing to 1080x1080. The shared converter used by the Instagram posters does the work.
         """
-        try:
-            # Open the image
-            image = Image.open(image_path)
-            
-            # Get the image dimensions
-            width, height = image.size
-            
-            # Determine the smaller dimension for a center crop
-            min_dim = min(width, height)
-            left = (width - min_dim) // 2
-            top = (height - min_dim) // 2
-            right = left + min_dim
-            bottom = top + min_dim
-            
-            # Crop the image to a square
-            image_cropped = image.crop((left, top, right, bottom))
-            
-            # Resize to 1080x1080 pixels using LANCZOS resampling filter
-            image_resized = image_cropped.resize((1080, 1080), resample=Image.LANCZOS)
-            
-            # Generate a new filename for the converted image
-            filename = os.path.basename(image_path)
-            name, ext = os.path.splitext(filename)
-            new_filename = f"{name}_instagram{ext}"
-            new_path = os.path.join(self.upload_folder, new_filename)
-            
-            # Save the resized image
-            image_resized.save(new_path)
-            
-            return new_path
-        except Exception as e:
-            print(f"Error converting image to Instagram size: {e}")
-            return image_path
\ No newline at end of file
+        return convert_to_instagram_size(image_path)
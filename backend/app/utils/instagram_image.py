@@ -0,0 +1,96 @@
+"""
+Conversion of images to Instagram's 1080x1080 square.
+Shared by the Instagram posters; conversions of unchanged files are cached.
+"""
+import io
+import os
+import hashlib
+import logging
+import threading
+from cachetools import LRUCache
+from PIL import Image, features
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+# The Instagram resize path is decode/encode bound; the official Pillow wheels
+# bundle libjpeg-turbo, source builds against plain libjpeg are much slower.
+# That is the same codec PyTurboJPEG wraps, and draft() already gives its
+# scaled decode, so there's nothing to gain from decoding through numpy.
+# Pillow-SIMD installs under the same PIL name and speeds up the resize further.
+# OpenCV or pyvips aren't used either: with draft() and reducing_gap the
+# LANCZOS pass only ever sees an image a few times larger than 1080x1080, so
+# the resize is a small part of the conversion next to decode and encode
+if not features.check_feature('libjpeg_turbo'):
+    logger.warning("Pillow %s is not using libjpeg-turbo; JPEG decoding will be slower", Image.__version__)
+
+# Converted image paths keyed by the source's path, mtime and size, so
+# reposting an unchanged image skips the decode/resize/encode
+_CONVERT_CACHE = LRUCache(maxsize=256)
+_CONVERT_LOCK = threading.Lock()
+
+def convert_to_instagram_size(image_path):
+    """
+    Convert the image to 1080x1080 by center-cropping and resizing.
+    """
+    try:
+        # Reuse an earlier conversion of the same, unmodified file
+        st = os.stat(image_path)
+        key = (os.path.abspath(image_path), st.st_mtime_ns, st.st_size)
+        with _CONVERT_LOCK:
+            cached_path = _CONVERT_CACHE.get(key)
+        if cached_path is not None and os.path.exists(cached_path):
+            logger.info("Reusing converted image: %s", cached_path)
+            return cached_path
+
+        with Image.open(image_path) as image:
+            # JPEGs are decoded at the smallest DCT scale that still covers
+            # 1080x1080, other formats ignore the draft request
+            image.draft('RGB', (1080, 1080))
+
+            # Bilevel and palette images would be resized with NEAREST, so only
+            # they are converted up front
+            if image.mode in ('1', 'P'):
+                image = image.convert('RGB')
+
+            # Center-crop to a square and resize to 1080x1080 in one pass; the
+            # box keeps the crop inside the resize, and reducing_gap first
+            # shrinks large sources by a whole factor with a cheap box filter
+            width, height = image.size
+            side = min(width, height)
+            left, top = (width - side) / 2, (height - side) / 2
+            image_resized = image.resize(
+                (1080, 1080), Image.LANCZOS, box=(left, top, left + side, top + side), reducing_gap=3.0
+            )
+
+            # Other modes are converted after resizing, which touches 1080x1080
+            # pixels instead of the full-resolution crop
+            if image_resized.mode != 'RGB':
+                image_resized = image_resized.convert('RGB')
+        
+        # Generate a new filename for the converted image; the short hash of the
+        # source path keeps a.jpg and a.png from writing to the same file
+        filename = os.path.basename(image_path)
+        name, ext = os.path.splitext(filename)
+        source_hash = hashlib.sha1(key[0].encode()).hexdigest()[:8]
+        new_filename = f"{name}_instagram_{source_hash}.jpg"
+        
+        # Use the same directory as the original image
+        output_dir = os.path.dirname(image_path)
+        new_path = os.path.join(output_dir, new_filename)
+        
+        # Save as a baseline 4:2:0 JPEG; Instagram re-encodes uploads anyway, so
+        # the extra Huffman optimisation and progressive scans aren't worth the time.
+        # The JPEG is encoded in memory and written out with a single write
+        buffer = io.BytesIO()
+        image_resized.save(buffer, 'JPEG', quality=90, subsampling=2, optimize=False, progressive=False)
+        with open(new_path, 'wb') as f:
+            f.write(buffer.getbuffer())
+        
+        logger.info("Converted image saved to: %s", new_path)
+        with _CONVERT_LOCK:
+            _CONVERT_CACHE[key] = new_path
+        return new_path
+    except Exception as e:
+        logger.error("Error converting image: %s", e)
+        return image_path
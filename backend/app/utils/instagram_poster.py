@@ -1,46 +1,103 @@
+import io
 import os
+import glob
 import tempfile
 import shutil
+import signal
 import logging
-from instabot import Bot
+import threading
+import contextlib
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from cachetools import LRUCache
 from flask import current_app
 from app.models import Post, db
+from app.utils.instagram_image import convert_to_instagram_size
+from app.utils.image_files import sniff_image_format
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Threads running post_to_instagram for post_to_instagram_direct; reused
+# across posts and capping how many log in to Instagram at once
+POSTER_POOL_SIZE = 4
+_poster_pool = ThreadPoolExecutor(max_workers=POSTER_POOL_SIZE, thread_name_prefix='ig-post')
+
+# Seconds post_to_instagram_direct waits for the posting process
+POST_TIMEOUT = 90
+
+# Folders searched when a post's stored image path no longer exists
+_BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.dirname(__file__)))
+UPLOAD_FOLDER = os.path.join(_BACKEND_DIR, 'uploads')
+STATIC_FOLDER = os.path.join(_BACKEND_DIR, 'static')
+
+# Session file locations checked by _clean_session_files; the working
+# directory no longer changes after startup, so these are fixed per process
+_TEMP_DIR = tempfile.gettempdir()
+_WORK_DIR = os.getcwd()
+_CONFIG_DIRS = (os.path.join(_TEMP_DIR, 'config'), os.path.join(_WORK_DIR, 'config'))
+_COOKIE_FILES = tuple(
+    os.path.join(directory, 'instagram.json')
+    for directory in (_TEMP_DIR, _WORK_DIR, os.path.expanduser('~'))
+)
+_WORK_UPLOADS_DIR = os.path.join(_WORK_DIR, 'uploads')
+
+# Where stored image paths that had to be searched for were found
+_RESOLVED_PATHS = LRUCache(maxsize=1024)
+_RESOLVED_LOCK = threading.Lock()
+
+@contextlib.contextmanager
+def _suppress_sigint():
+    """
+    Ignore SIGINT for the duration of the block. Handlers can only be changed
+    from the main thread, so elsewhere the block runs unchanged.
+    """
+    if threading.current_thread() is not threading.main_thread():
+        yield
+        return
+
+    original_handler = signal.signal(signal.SIGINT, signal.SIG_IGN)
+    try:
+        yield
+    finally:
+        signal.signal(signal.SIGINT, original_handler)
+
 class InstagramPoster:
     """Class for posting to Instagram using Instabot."""
 
+    # Session files are only wiped before the first login in this process
+    _session_clean_done = False
+
     def __init__(self):
         """Initialize the Instagram poster."""
         self.bot = None
 
     def _initialize_bot(self):
         """Initialize the Instagram bot with a fresh session."""
+        # instabot pulls in a large import tree, so it is only loaded once a
+        # post is actually made
+        from instabot import Bot
+
         try:
             # Clean up any existing session files to force a fresh login
-            logger.info("Cleaning up any existing Instagram session files...")
-            self._clean_session_files()
-            logger.info("Session files cleaned successfully")
+            if not InstagramPoster._session_clean_done:
+                logger.info("Cleaning up any existing Instagram session files...")
+                self._clean_session_files()
+                InstagramPoster._session_clean_done = True
+                logger.info("Session files cleaned successfully")
 
             # Create a new bot instance with verbose logging
             logger.info("Creating new Instabot instance...")
 
             # Set up a temporary directory for the bot
-            import tempfile
-            import os
-            temp_dir = os.path.join(tempfile.gettempdir(), f'instabot_{os.getpid()}')
+            temp_dir = os.path.join(_TEMP_DIR, f'instabot_{os.getpid()}')
             os.makedirs(temp_dir, exist_ok=True)
 
-            # Temporarily modify the environment to redirect config
-            import os
-            old_cwd = os.getcwd()
-            os.chdir(temp_dir)
-
-            # Initialize the bot with custom settings
+            # Initialize the bot with custom settings; base_path points its
+            # config and cookie files at the temporary directory, as chdir'ing
+            # there would change the working directory of every thread
             self.bot = Bot(
+                base_path=os.path.join(temp_dir, 'config') + os.sep,
                 # Disable some features to make it more reliable
                 filter_users=False,
                 filter_private_users=False,
@@ -53,14 +110,9 @@ class InstagramPoster:
                 verbosity=True
             )
 
-            # Restore the working directory
-            os.chdir(old_cwd)
-
             logger.info("Instabot instance created successfully")
         except Exception as e:
-            logger.error(f"Error initializing Instagram bot: {e}")
-            import traceback
-            logger.error(traceback.format_exc())
+            logger.exception("Error initializing Instagram bot: %s", e)
             # Create a basic bot as fallback
             self.bot = Bot()
             logger.info("Created fallback Instabot instance")
@@ -68,64 +120,63 @@ class InstagramPoster:
     def _clean_session_files(self):
         """Clean up any existing session files to force a fresh login."""
         try:
-            # Get the temp directory
-            temp_dir = tempfile.gettempdir()
-
-            # Clean up config directory
-            config_dir = os.path.join(temp_dir, 'config')
-            logger.info(f"Looking for Instabot config directory at: {config_dir}")
-            if os.path.exists(config_dir):
-                logger.info(f"Found existing config directory, removing: {config_dir}")
-                shutil.rmtree(config_dir)
-                logger.info("Config directory removed successfully")
-            else:
-                logger.info("No existing config directory found")
+            # Clean up config directories in the temp and current directories;
+            # a missing directory is the common case, so just try the removal
+            for config_dir in _CONFIG_DIRS:
+                try:
+                    shutil.rmtree(config_dir)
+                    logger.info("Removed existing config directory: %s", config_dir)
+                except FileNotFoundError:
+                    pass
 
             # Clean up cookie files
-            cookie_files = [
-                os.path.join(temp_dir, 'instagram.json'),
-                os.path.join(os.getcwd(), 'instagram.json'),
-                os.path.join(os.path.expanduser('~'), 'instagram.json')
-            ]
-            for cookie_file in cookie_files:
-                if os.path.exists(cookie_file):
-                    logger.info(f"Found existing cookie file, removing: {cookie_file}")
+            for cookie_file in _COOKIE_FILES:
+                try:
                     os.remove(cookie_file)
+                    logger.info("Removed existing cookie file: %s", cookie_file)
+                except FileNotFoundError:
+                    pass
 
             # Clean up process-specific config directories
-            for item in os.listdir(temp_dir):
-                if item.startswith('instabot_'):
-                    item_path = os.path.join(temp_dir, item)
-                    if os.path.isdir(item_path):
-                        logger.info(f"Found existing instabot directory, removing: {item_path}")
-                        shutil.rmtree(item_path)
-
-            # Clean up any config directories in the current directory
-            current_dir_config = os.path.join(os.getcwd(), 'config')
-            if os.path.exists(current_dir_config):
-                logger.info(f"Found config directory in current directory, removing: {current_dir_config}")
-                shutil.rmtree(current_dir_config)
-
-            # Clean up any cookie files in the current directory
-            for item in os.listdir(os.getcwd()):
-                if item.endswith('.checkpoint') or item.endswith('.json'):
-                    if 'instagram' in item.lower() or 'instabot' in item.lower():
-                        item_path = os.path.join(os.getcwd(), item)
-                        logger.info(f"Found Instagram-related file, removing: {item_path}")
-                        os.remove(item_path)
-                        
+            for item_path in glob.iglob(os.path.join(_TEMP_DIR, 'instabot_*')):
+                if os.path.isdir(item_path):
+                    logger.info("Found existing instabot directory, removing: %s", item_path)
+                    shutil.rmtree(item_path, ignore_errors=True)
+
+            # Clean up any cookie files in the current directory; scandir
+            # reports file types without a stat per entry
+            with os.scandir(_WORK_DIR) as entries:
+                for entry in entries:
+                    if entry.name.endswith(('.checkpoint', '.json')) and entry.is_file():
+                        name = entry.name.lower()
+                        if 'instagram' in name or 'instabot' in name:
+                            logger.info("Found Instagram-related file, removing: %s", entry.path)
+                            os.remove(entry.path)
+
             # Clean up any .REMOVE_ME files in the uploads directory
-            uploads_dir = os.path.join(os.getcwd(), 'uploads')
-            if os.path.exists(uploads_dir):
-                for item in os.listdir(uploads_dir):
-                    if item.endswith('.REMOVE_ME'):
-                        item_path = os.path.join(uploads_dir, item)
-                        logger.info(f"Found .REMOVE_ME file, removing: {item_path}")
-                        os.remove(item_path)
+            for item_path in glob.iglob(os.path.join(_WORK_UPLOADS_DIR, '*.REMOVE_ME')):
+                logger.info("Found .REMOVE_ME file, removing: %s", item_path)
+                os.remove(item_path)
         except Exception as e:
-            logger.error(f"Error cleaning session files: {e}")
-            import traceback
-            logger.error(traceback.format_exc())
+            logger.exception("Error cleaning session files: %s", e)
+
+    def _login(self, username, password):
+        """Log self.bot in to Instagram, returning True on success."""
+        logger.info("Attempting to login to Instagram as %s", username)
+        try:
+            # Perform the login with Ctrl+C ignored
+            with _suppress_sigint():
+                login_success = self.bot.login(username=username, password=password)
+
+            if not login_success:
+                logger.error("Failed to login to Instagram - login returned False")
+                return False
+
+            logger.info("Successfully logged in to Instagram")
+            return True
+        except Exception as login_error:
+            logger.error("Exception during Instagram login: %s", login_error)
+            return False
 
     def post_to_instagram(self, image_path, caption, username, password, post_type='post'):
         """
@@ -144,124 +195,81 @@ class InstagramPoster:
         try:
             # Check if the image exists
             if not os.path.exists(image_path):
-                logger.error(f"Image file does not exist at path: {image_path}")
+                logger.error("Image file does not exist at path: %s", image_path)
                 return False
 
-            # Check if the image is a valid image file
+            # JPEGs and PNGs, which Instagram accepts as they are, are
+            # recognised from their first bytes without handing the file to PIL
             try:
-                from PIL import Image
-                img = Image.open(image_path)
-                img_format = img.format
-                img_size = img.size
-                logger.info(f"Image validated: Format={img_format}, Size={img_size}")
-
-                # Make sure the image is in a format Instagram accepts
-                if img_format not in ['JPEG', 'JPG', 'PNG']:
-                    logger.info(f"Converting image from {img_format} to JPEG for Instagram compatibility")
+                sniffed_format = sniff_image_format(image_path)
+            except OSError as read_error:
+                logger.error("Could not read image file: %s", read_error)
+                return False
+
+            if sniffed_format is None:
+                # Check if the image is a valid image file
+                try:
+                    from PIL import Image
+                    img = Image.open(image_path)
+                    img_format = img.format
+                    img_size = img.size
+                    logger.info("Image validated: Format=%s, Size=%s", img_format, img_size)
+
+                    # Make sure the image is in a format Instagram accepts
+                    logger.info("Converting image from %s to JPEG for Instagram compatibility", img_format)
                     # Convert to RGB (in case it's RGBA or another mode)
                     if img.mode != 'RGB':
                         img = img.convert('RGB')
-                    # Save as JPEG
+                    # Save as JPEG, encoded in memory and written out with a
+                    # single write like the shared converter's output
                     jpeg_path = os.path.splitext(image_path)[0] + '.jpg'
-                    img.save(jpeg_path, 'JPEG', quality=95)
+                    buffer = io.BytesIO()
+                    img.save(buffer, 'JPEG', quality=90, subsampling=2, optimize=False, progressive=False)
+                    with open(jpeg_path, 'wb') as f:
+                        f.write(buffer.getbuffer())
                     image_path = jpeg_path
-                    logger.info(f"Image converted and saved to: {image_path}")
-            except Exception as img_error:
-                logger.error(f"Invalid image file: {img_error}")
-                return False
+                    logger.info("Image converted and saved to: %s", image_path)
+                except Exception as img_error:
+                    logger.error("Invalid image file: %s", img_error)
+                    return False
 
             # Initialize the bot with detailed logging
             logger.info("Initializing Instagram bot with disabled persistence...")
             self._initialize_bot()
             logger.info("Bot initialized successfully")
 
-            # Login to Instagram with detailed error handling
-            logger.info(f"Attempting to login to Instagram as {username}")
-            try:
-                # Disable signal handling for login
-                import signal
-                original_handler = None
-
-                # Try to disable signal handling if possible
-                try:
-                    # Save the original SIGINT handler
-                    original_handler = signal.getsignal(signal.SIGINT)
-                    # Set a dummy handler
-                    signal.signal(signal.SIGINT, lambda sig, frame: None)
-                    logger.info("Temporarily disabled SIGINT handling")
-                except (ValueError, TypeError, AttributeError) as signal_error:
-                    logger.warning(f"Could not disable signal handling: {signal_error}")
-
-                # Perform the login
-                login_success = self.bot.login(username=username, password=password)
-
-                # Restore the original signal handler if we changed it
-                if original_handler is not None:
-                    try:
-                        signal.signal(signal.SIGINT, original_handler)
-                        logger.info("Restored original SIGINT handling")
-                    except Exception as restore_error:
-                        logger.warning(f"Error restoring signal handler: {restore_error}")
-
-                if not login_success:
-                    logger.error("Failed to login to Instagram - login returned False")
-                    return False
-
-                logger.info("Successfully logged in to Instagram")
-            except Exception as login_error:
-                logger.error(f"Exception during Instagram login: {login_error}")
+            if not self._login(username, password):
                 return False
 
             # Post the image with detailed error handling
             try:
-                # Disable signal handling for upload
-                import signal
-                original_handler = None
-
-                # Try to disable signal handling if possible
-                try:
-                    # Save the original SIGINT handler
-                    original_handler = signal.getsignal(signal.SIGINT)
-                    # Set a dummy handler
-                    signal.signal(signal.SIGINT, lambda sig, frame: None)
-                    logger.info("Temporarily disabled SIGINT handling for upload")
-                except (ValueError, TypeError, AttributeError) as signal_error:
-                    logger.warning(f"Could not disable signal handling for upload: {signal_error}")
-
-                # Perform the upload
-                if post_type == 'story':
-                    # Upload as a story
-                    logger.info(f"Uploading story to Instagram: {image_path}")
-                    upload_success = self.bot.upload_story_photo(image_path)
-                else:
-                    # Check for and remove any existing .REMOVE_ME files
-                    remove_me_path = f"{image_path}.REMOVE_ME"
-                    if os.path.exists(remove_me_path):
-                        logger.info(f"Removing existing .REMOVE_ME file: {remove_me_path}")
-                        try:
-                            os.remove(remove_me_path)
-                        except Exception as rm_error:
-                            logger.warning(f"Could not remove .REMOVE_ME file: {rm_error}")
-                    
-                    # Upload as a regular post
-                    logger.info(f"Uploading post to Instagram: {image_path}")
-                    logger.info(f"Caption: {caption[:50]}..." if len(caption) > 50 else f"Caption: {caption}")
-                    upload_success = self.bot.upload_photo(image_path, caption=caption)
-
-                # Restore the original signal handler if we changed it
-                if original_handler is not None:
-                    try:
-                        signal.signal(signal.SIGINT, original_handler)
-                        logger.info("Restored original SIGINT handling after upload")
-                    except Exception as restore_error:
-                        logger.warning(f"Error restoring signal handler after upload: {restore_error}")
+                # Perform the upload with Ctrl+C ignored
+                with _suppress_sigint():
+                    if post_type == 'story':
+                        # Upload as a story
+                        logger.info("Uploading story to Instagram: %s", image_path)
+                        upload_success = self.bot.upload_story_photo(image_path)
+                    else:
+                        # Check for and remove any existing .REMOVE_ME files
+                        remove_me_path = f"{image_path}.REMOVE_ME"
+                        if os.path.exists(remove_me_path):
+                            logger.info("Removing existing .REMOVE_ME file: %s", remove_me_path)
+                            try:
+                                os.remove(remove_me_path)
+                            except Exception as rm_error:
+                                logger.warning("Could not remove .REMOVE_ME file: %s", rm_error)
+
+                        # Upload as a regular post
+                        logger.info("Uploading post to Instagram: %s", image_path)
+                        logger.info("Caption: %.50s%s", caption, "..." if len(caption) > 50 else "")
+                        upload_success = self.bot.upload_photo(image_path, caption=caption)
 
                 if upload_success:
                     logger.info("Successfully posted to Instagram")
                 else:
                     logger.error("Failed to post to Instagram - upload returned False")
             except Exception as upload_error:
-                logger.error(f"Exception during Instagram upload: {upload_error}")
+                logger.error("Exception during Instagram upload: %s", upload_error)
                 # Handle the specific file rename error
                 if "Cannot create a file when that file already exists" in str(upload_error) and ".REMOVE_ME" in str(upload_error):
                     logger.info("Post was likely successful despite the .REMOVE_ME file error")
@@ -274,16 +282,74 @@ class InstagramPoster:
                 self.bot.logout()
                 logger.info("Successfully logged out from Instagram")
             except Exception as logout_error:
-                logger.error(f"Error during logout: {logout_error}")
+                logger.error("Error during logout: %s", logout_error)
                 # Don't return False here, as the upload might have succeeded
 
-            return upload_success if 'upload_success' in locals() else False
+            return upload_success
         except Exception as e:
-            logger.error(f"Unexpected error posting to Instagram: {e}")
-            import traceback
-            logger.error(traceback.format_exc())
+            logger.exception("Unexpected error posting to Instagram: %s", e)
             return False
 
+def _resolve_image_path(image_path):
+    """
+    Return where the image stored as image_path actually is, trying the
+    upload and static folders and then a name search of the upload folder.
+    Falls back to image_path itself if nothing is found.
+    """
+    # Try multiple approaches to find the image
+    if os.path.exists(image_path):
+        return image_path
+
+    logger.warning("Image not found at original path: %s", image_path)
+
+    # Reuse an earlier search while its result is still on disk
+    with _RESOLVED_LOCK:
+        resolved_path = _RESOLVED_PATHS.get(image_path)
+    if resolved_path is not None and os.path.exists(resolved_path):
+        logger.info("Found image at previously resolved path: %s", resolved_path)
+        return resolved_path
+
+    resolved_path = _search_image_path(image_path)
+    if resolved_path is not None:
+        with _RESOLVED_LOCK:
+            _RESOLVED_PATHS[image_path] = resolved_path
+        return resolved_path
+    return image_path
+
+def _search_image_path(image_path):
+    # Use a default upload folder
+    logger.info("Using default upload folder: %s", UPLOAD_FOLDER)
+
+    # Approach 1: Try with upload folder
+    basename = os.path.basename(image_path)
+    possible_path1 = os.path.join(UPLOAD_FOLDER, basename)
+    logger.info("Trying path with upload folder: %s", possible_path1)
+    if os.path.exists(possible_path1):
+        logger.info("Found image at: %s", possible_path1)
+        return possible_path1
+
+    # Approach 2: Try with static folder
+    possible_path2 = os.path.join(STATIC_FOLDER, basename)
+    logger.info("Trying path with static folder: %s", possible_path2)
+    if os.path.exists(possible_path2):
+        logger.info("Found image at: %s", possible_path2)
+        return possible_path2
+
+    # Approach 3: Search in upload folder for any file with similar name; the
+    # match is case-insensitive, so the names are compared here rather than
+    # with a glob
+    logger.info("Searching in upload folder for files with similar name to: %s", basename)
+    needle = basename.lower()
+    try:
+        with os.scandir(UPLOAD_FOLDER) as entries:
+            for entry in entries:
+                if needle in entry.name.lower():
+                    logger.info("Found potential match: %s", entry.path)
+                    return entry.path
+    except FileNotFoundError:
+        pass
+    return None
+
 def post_to_instagram_direct(post_id, username, password):
     """
     Post directly to Instagram.
@@ -297,186 +363,75 @@ def post_to_instagram_direct(post_id, username, password):
         bool: True if the post was successful, False otherwise.
     """
     try:
-        # Import necessary modules
-        import threading
-        import time
-        from PIL import Image
-
-        logger.info(f"Starting Instagram posting process for post ID: {post_id}")
-        logger.info(f"Using Instagram username: {username}")
+        logger.info("Starting Instagram posting process for post ID: %s", post_id)
+        logger.info("Using Instagram username: %s", username)
 
         # Get the post
         post = Post.query.get(post_id)
 
         if not post:
-            logger.error(f"Post {post_id} not found in database")
+            logger.error("Post %s not found in database", post_id)
             return False
 
-        logger.info(f"Post found: ID={post.id}, Caption={post.caption[:30]}...")
+        logger.info("Post found: ID=%s, Caption=%.30s...", post.id, post.caption)
 
         # Check if the image exists
         if not post.image_path:
-            logger.error(f"No image path found for post {post_id}")
+            logger.error("No image path found for post %s", post_id)
             return False
 
-        logger.info(f"Original image path from post: {post.image_path}")
+        logger.info("Original image path from post: %s", post.image_path)
 
         # Fix the image path if it's relative
-        full_image_path = post.image_path
+        full_image_path = _resolve_image_path(post.image_path)
 
-        # Try multiple approaches to find the image
         if not os.path.exists(full_image_path):
-            logger.warning(f"Image not found at original path: {full_image_path}")
-
-            # Use a default upload folder
-            upload_folder = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), 'uploads')
-            logger.info(f"Using default upload folder: {upload_folder}")
-
-            # Approach 1: Try with upload folder
-            basename = os.path.basename(post.image_path)
-            possible_path1 = os.path.join(upload_folder, basename)
-            logger.info(f"Trying path with upload folder: {possible_path1}")
-
-            if os.path.exists(possible_path1):
-                full_image_path = possible_path1
-                logger.info(f"Found image at: {full_image_path}")
-            else:
-                # Approach 2: Try with static folder
-                static_folder = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), 'static')
-                possible_path2 = os.path.join(static_folder, basename)
-                logger.info(f"Trying path with static folder: {possible_path2}")
-
-                if os.path.exists(possible_path2):
-                    full_image_path = possible_path2
-                    logger.info(f"Found image at: {full_image_path}")
-                else:
-                    # Approach 3: Search in upload folder for any file with similar name
-                    logger.info(f"Searching in upload folder for files with similar name to: {basename}")
-                    if os.path.exists(upload_folder):
-                        for filename in os.listdir(upload_folder):
-                            if basename.lower() in filename.lower():
-                                possible_path3 = os.path.join(upload_folder, filename)
-                                logger.info(f"Found potential match: {possible_path3}")
-                                full_image_path = possible_path3
-                                break
-
-        if not os.path.exists(full_image_path):
-            logger.error(f"Image not found after all attempts. Last tried path: {full_image_path}")
+            logger.error("Image not found after all attempts. Last tried path: %s", full_image_path)
             return False
 
-        logger.info(f"Final image path to use: {full_image_path}")
+        logger.info("Final image path to use: %s", full_image_path)
 
         # Get file info for debugging
         try:
             file_size = os.path.getsize(full_image_path) / 1024  # Size in KB
-            logger.info(f"Image file size: {file_size:.2f} KB")
+            logger.info("Image file size: %.2f KB", file_size)
         except Exception as size_error:
-            logger.warning(f"Could not get file size: {size_error}")
+            logger.warning("Could not get file size: %s", size_error)
 
-        # Convert the image to Instagram size
-        try:
-            logger.info("Converting image to Instagram size...")
-
-            # Open the image
-            image = Image.open(full_image_path)
-
-            # Check format and convert if needed
-            img_format = image.format
-            logger.info(f"Image format: {img_format}")
-
-            # Make sure the image is in a format Instagram accepts
-            if img_format not in ['JPEG', 'JPG', 'PNG']:
-                logger.info(f"Converting image from {img_format} to JPEG for Instagram compatibility")
-                # Convert to RGB (in case it's RGBA or another mode)
-                if image.mode != 'RGB':
-                    image = image.convert('RGB')
-
-            # Get the image dimensions
-            width, height = image.size
-            logger.info(f"Original image dimensions: {width}x{height}")
-
-            # Determine the smaller dimension for a center crop
-            min_dim = min(width, height)
-            left = (width - min_dim) // 2
-            top = (height - min_dim) // 2
-            right = left + min_dim
-            bottom = top + min_dim
-
-            # Crop the image to a square
-            image_cropped = image.crop((left, top, right, bottom))
-
-            # Resize to 1080x1080 pixels using LANCZOS resampling filter
-            image_resized = image_cropped.resize((1080, 1080), resample=Image.LANCZOS)
-
-            # Generate a new filename for the converted image
-            filename = os.path.basename(full_image_path)
-            name, ext = os.path.splitext(filename)
-            new_filename = f"{name}_instagram.jpg"  # Always use .jpg extension
-
-            # Use the same directory as the original image
-            output_dir = os.path.dirname(full_image_path)
-            instagram_image_path = os.path.join(output_dir, new_filename)
-
-            # Save the resized image as JPEG
-            image_resized.save(instagram_image_path, 'JPEG', quality=95)
-            logger.info(f"Saved Instagram-sized image to: {instagram_image_path}")
-
-            # Verify the converted image
-            if not os.path.exists(instagram_image_path):
-                logger.error(f"Converted image not found at: {instagram_image_path}")
-                logger.info("Using original image as fallback")
-                instagram_image_path = full_image_path
-        except Exception as convert_error:
-            logger.error(f"Error converting image: {convert_error}")
-            import traceback
-            logger.error(traceback.format_exc())
-            logger.info("Using original image as fallback")
-            instagram_image_path = full_image_path
+        # Convert the image to Instagram size; falls back to the original image on error
+        logger.info("Converting image to Instagram size...")
+        instagram_image_path = convert_to_instagram_size(full_image_path)
 
         # Post to Instagram using a thread to avoid signal issues
         logger.info("Creating Instagram poster...")
         instagram_poster = InstagramPoster()
 
         logger.info("Starting Instagram posting process...")
-        logger.info(f"Image path: {instagram_image_path}")
-        logger.info(f"Caption: {post.caption[:50]}..." if len(post.caption) > 50 else f"Caption: {post.caption}")
-        logger.info(f"Username: {username}")
-        logger.info(f"Post type: {post.post_type}")
-
-        # Use a thread with timeout for the entire posting process
-        success = False
-        posting_error = None
-
-        def posting_thread():
-            nonlocal success, posting_error
-            try:
-                success = instagram_poster.post_to_instagram(
-                    instagram_image_path,
-                    post.caption,
-                    username,
-                    password,
-                    post.post_type
-                )
-            except Exception as e:
-                posting_error = e
-
-        # Start posting in a separate thread
-        thread = threading.Thread(target=posting_thread)
-        thread.daemon = True
-        thread.start()
-
-        # Wait for posting with timeout
-        timeout = 90  # seconds (longer for the entire process)
-        start_time = time.time()
-        while thread.is_alive() and time.time() - start_time < timeout:
-            time.sleep(1)
-
-        if thread.is_alive():
-            logger.error(f"Instagram posting timed out after {timeout} seconds")
+        logger.info("Image path: %s", instagram_image_path)
+        logger.info("Caption: %.50s%s", post.caption, "..." if len(post.caption) > 50 else "")
+        logger.info("Username: %s", username)
+        logger.info("Post type: %s", post.post_type)
+
+        # Run the posting process on the pool with a timeout
+        future = _poster_pool.submit(
+            instagram_poster.post_to_instagram,
+            instagram_image_path,
+            post.caption,
+            username,
+            password,
+            post.post_type
+        )
+        try:
+            success = future.result(timeout=POST_TIMEOUT)
+        except FutureTimeoutError:
+            logger.error("Instagram posting timed out after %s seconds", POST_TIMEOUT)
+            # A post still waiting for a pool thread must not go out after
+            # it has been reported as failed; a running one can't be stopped
+            if future.cancel():
+                logger.info("Cancelled the queued Instagram post before it started")
             return False
-
-        if posting_error:
-            logger.error(f"Exception during Instagram posting: {posting_error}")
+        except Exception as posting_error:
+            logger.error("Exception during Instagram posting: %s", posting_error)
             return False
 
         if success:
@@ -489,20 +444,5 @@ def post_to_instagram_direct(post_id, username, password):
             logger.error("Failed to post to Instagram")
             return False
     except Exception as e:
-        logger.error(f"Error in post_to_instagram_direct: {e}")
-        import traceback
-        logger.error(traceback.format_exc())
+        logger.exception("Error in post_to_instagram_direct: %s", e)
         return False
-
-        if success:
-            # Update the post status
-            post.is_posted = True
-            db.session.commit()
-            logger.info(f"Post {post_id} successfully posted to Instagram")
-            return True
-        else:
-            logger.error(f"Failed to post {post_id} to Instagram")
-            return False
-    except Exception as e:
-        logger.error(f"Error in post_to_instagram_direct: {e}")
-        return False
\ No newline at end of file
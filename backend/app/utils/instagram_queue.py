@@ -0,0 +1,37 @@
+"""
+Bounded queue for background Instagram posting.
+Jobs run on the app's instagram_executor. Once MAX_PENDING jobs are queued or
+running, new submissions are refused instead of piling up behind the pool.
+"""
+import logging
+import threading
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+# Jobs allowed to wait for or hold a posting worker at once
+MAX_PENDING = 16
+
+_slots = threading.BoundedSemaphore(MAX_PENDING)
+
+class QueueFull(Exception):
+    """Raised when the posting queue has no free slots."""
+
+def submit_instagram_job(app, job, *args):
+    """
+    Queue job(*args) on app.instagram_executor.
+    Raises QueueFull without queueing anything when MAX_PENDING jobs are
+    already waiting or running.
+    """
+    if not _slots.acquire(blocking=False):
+        logger.warning("Instagram posting queue is full (%d jobs)", MAX_PENDING)
+        raise QueueFull(f"{MAX_PENDING} Instagram posts are already queued")
+
+    try:
+        future = app.instagram_executor.submit(job, *args)
+    except Exception:
+        _slots.release()
+        raise
+
+    future.add_done_callback(lambda _: _slots.release())
+    return future
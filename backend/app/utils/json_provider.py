@@ -0,0 +1,34 @@
+"""
+Flask JSON provider backed by orjson.
+Responses are encoded straight to bytes; anything orjson can't encode natively
+goes through Flask's default() so the output matches the stdlib provider.
+"""
+import orjson
+from flask.json.provider import DefaultJSONProvider
+
+# datetimes keep Flask's HTTP-date formatting instead of orjson's ISO output
+_OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+
+class OrjsonProvider(DefaultJSONProvider):
+    """DefaultJSONProvider that uses orjson for compact output."""
+
+    def dumps(self, obj, **kwargs):
+        # Formatting options such as indent are only supported by the stdlib
+        if kwargs:
+            return super().dumps(obj, **kwargs)
+        return orjson.dumps(obj, default=self.default, option=_OPTIONS).decode()
+
+    def loads(self, s, **kwargs):
+        if kwargs:
+            return super().loads(s, **kwargs)
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+
+        # Pretty-printed debug output stays on the stdlib path
+        if (self.compact is None and self._app.debug) or self.compact is False:
+            return super().response(obj)
+
+        body = orjson.dumps(obj, default=self.default, option=_OPTIONS | orjson.OPT_APPEND_NEWLINE)
+        return self._app.response_class(body, mimetype=self.mimetype)
@@ -0,0 +1,123 @@
+"""
+Short-lived caches for decoded JWT claims and the users they resolve to.
+Repeat requests with the same bearer token skip signature verification and
+the user lookup while the entries are fresh. Username lookups for login are
+cached the same way.
+"""
+import hashlib
+import threading
+import time
+from cachetools import TTLCache
+from flask import g, has_request_context, request
+from sqlalchemy import inspect
+from sqlalchemy.orm import make_transient_to_detached
+from app import db
+from app.models import User
+
+_lock = threading.RLock()
+_claims_cache = TTLCache(maxsize=10000, ttl=30)
+_user_cache = TTLCache(maxsize=10000, ttl=30)
+_username_cache = TTLCache(maxsize=4096, ttl=60)
+_missing_user_cache = TTLCache(maxsize=1024, ttl=10)
+
+# Largest id a PostgreSQL INTEGER primary key can hold
+MAX_USER_ID = 2 ** 31 - 1
+
+def pin_token_hash():
+    """Hash the request's bearer token once and keep it on flask.g."""
+    auth = request.headers.get('Authorization', '')
+    if auth.startswith('Bearer '):
+        g.bearer_token = auth[len('Bearer '):]
+        g.token_hash = hashlib.sha256(g.bearer_token.encode()).digest()
+    else:
+        g.bearer_token = g.token_hash = None
+
+def token_key(encoded_token):
+    """Return the cache key for an encoded token, reusing the hash pinned for this request."""
+    if has_request_context() and g.get('token_hash') is not None and g.bearer_token == encoded_token:
+        return g.token_hash
+    return hashlib.sha256(encoded_token.encode()).digest()
+
+def enable_claims_cache(jwt_manager):
+    """Memoize token decoding on the given JWTManager."""
+    decode = jwt_manager._decode_jwt_from_config
+
+    def cached_decode(encoded_token, csrf_value=None, allow_expired=False):
+        key = token_key(encoded_token)
+        with _lock:
+            claims = _claims_cache.get(key)
+
+        # Expired tokens always go through the normal decode so the
+        # regular expiry error is raised
+        if claims is not None and (claims.get('exp') is None or claims['exp'] > time.time()):
+            return claims
+
+        claims = decode(encoded_token, csrf_value, allow_expired)
+        with _lock:
+            _claims_cache[key] = claims
+        return claims
+
+    jwt_manager._decode_jwt_from_config = cached_decode
+
+def parse_user_id(identity):
+    """Convert a JWT identity to a user id, raising ValueError if it can't name a user."""
+    user_id = int(identity)
+    if not 1 <= user_id <= MAX_USER_ID:
+        raise ValueError(f"User ID out of range: {user_id}")
+    return user_id
+
+def _detached_copy(user):
+    """
+    Return a detached User holding user's column values.
+    The request's own instance is expired by its session's next commit, which
+    would make every later cache hit reload it; the copy is never attached to
+    a session, so merge(load=False) can always be served from it.
+    """
+    mapper = inspect(User)
+    copy = mapper.class_manager.new_instance()
+    for attr in mapper.column_attrs:
+        setattr(copy, attr.key, getattr(user, attr.key))
+    make_transient_to_detached(copy)
+    return copy
+
+def get_user(user_id):
+    """Return the User for user_id, reusing a recently loaded row."""
+    with _lock:
+        user = _user_cache.get(user_id)
+        if user is None and user_id in _missing_user_cache:
+            return None
+    if user is not None:
+        # Attach the cached row to the current session without a round-trip
+        return db.session.merge(user, load=False)
+
+    user = User.query.get(user_id)
+    snapshot = _detached_copy(user) if user is not None else None
+    with _lock:
+        if user is not None:
+            _user_cache[user_id] = snapshot
+        else:
+            # Remember unknown ids briefly so bad tokens don't hit the database
+            _missing_user_cache[user_id] = True
+    return user
+
+def get_user_by_username(username):
+    """Return the User whose username matches case-insensitively, or None."""
+    key = username.lower()
+    with _lock:
+        user = _username_cache.get(key)
+    if user is not None:
+        return db.session.merge(user, load=False)
+
+    user = User.query.filter(db.func.lower(User.username) == key).first()
+    if user is not None:
+        snapshot = _detached_copy(user)
+        with _lock:
+            _username_cache[key] = snapshot
+    return user
+
+def invalidate_user(user):
+    """Drop the cached entries for a User after it has been modified."""
+    with _lock:
+        _user_cache.pop(user.id, None)
+        _missing_user_cache.pop(user.id, None)
+        _username_cache.pop(user.username.lower(), None)
@@ -2,6 +2,63 @@
 Mock caption generator for testing purposes.
 This module provides a fallback when the Cohere API is not available.
 """
+import copy
+
+# Basic templates for different styles, kept as the literals' bound format
+# methods so each caption is a single call
+CAPTION_TEMPLATES = {
+    'casual': "Just enjoying this {}! #LifeIsGood".format,
+    'formal': "A magnificent view of {}. #Photography".format,
+    'poetic': "In the embrace of {}, finding peace. #SoulfulMoments".format,
+    'humorous': "When {} is your only plan for the day! 😂 #NoRegrets".format,
+    'inspirational': "Let {} inspire your journey today. #Motivation".format,
+}
+
+STYLES = tuple(CAPTION_TEMPLATES)
+
+# (style, text, hashtags, emojis, formatting) for generate_caption_with_suggestions;
+# only the text is filled in per call, through its bound format method
+SUGGESTION_TEMPLATES = (
+    (
+        "casual",
+        "Just vibing with this {}! Life's simple pleasures.".format,
+        ("#GoodVibes", "#InstaDaily", "#LifeIsGood"),
+        ("😊", "✌️", "🌟"),
+        "Add a line break after the caption text",
+    ),
+    (
+        "poetic",
+        "In the gentle whispers of {}, I found a piece of my soul.".format,
+        ("#SoulfulMoments", "#Poetry", "#DeepThoughts"),
+        ("🌹", "✨", "💫"),
+        "Add a line break after each sentence",
+    ),
+    (
+        "humorous",
+        "When {} is your therapy! No regrets, just good times.".format,
+        ("#NoFilter", "#JustForLaughs", "#WeekendVibes"),
+        ("😂", "🤣", "🙌"),
+        "Add emojis at the end of the caption",
+    ),
+)
+
+def build_suggestions(description):
+    """Fill the suggestion templates in with description."""
+    captions = [
+        {
+            "style": style,
+            "text": text(description),
+            "hashtags": hashtags,
+            "emojis": emojis,
+            "formatting": formatting
+        }
+        for style, text, hashtags, emojis, formatting in SUGGESTION_TEMPLATES
+    ]
+    return {"captions": captions}
+
+# Response for a missing description; the JSON shape has to stay dicts and
+# lists, so only this case can be prepared ahead of time
+DEFAULT_SUGGESTIONS = build_suggestions("a beautiful scene")
 
 class MockCaptionGenerator:
     """Mock caption generator that doesn't require external APIs."""
@@ -21,22 +78,11 @@ class MockCaptionGenerator:
         Returns:
             str: The generated caption.
         """
-        # Basic templates for different styles
-        templates = {
-            'casual': "Just enjoying this {description}! #LifeIsGood",
-            'formal': "A magnificent view of {description}. #Photography",
-            'poetic': "In the embrace of {description}, finding peace. #SoulfulMoments",
-            'humorous': "When {description} is your only plan for the day! 😂 #NoRegrets",
-            'inspirational': "Let {description} inspire your journey today. #Motivation"
-        }
-        
         # Default to casual if style not provided or not in templates
-        style = style if style in templates else 'casual'
+        template = CAPTION_TEMPLATES.get(style, CAPTION_TEMPLATES['casual'])
         
         # Generate caption from template
-        caption = templates[style].format(description=description.lower())
-        
-        return caption
+        return template(description.lower())
     
     def generate_multiple_captions(self, description, num_captions=3):
         """
@@ -49,15 +95,9 @@ class MockCaptionGenerator:
         Returns:
             dict: A dictionary containing the generated captions with their styles.
         """
-        styles = ["casual", "formal", "poetic", "humorous", "inspirational"]
-        captions = {}
-        
-        # Generate a caption for each style
-        for style in styles[:num_captions]:
-            caption = self.generate_caption(description, style)
-            captions[style] = caption
-        
-        return captions
+        # Generate a caption for each style, lowercasing the description once
+        description = description.lower()
+        return {style: CAPTION_TEMPLATES[style](description) for style in STYLES[:num_captions]}
     
     def generate_caption_with_suggestions(self, description):
         """
@@ -69,33 +109,9 @@ class MockCaptionGenerator:
         Returns:
             dict: A dictionary containing the generated captions and suggestions.
         """
-        # Ensure description is not empty
-        if not description or description.strip() == "":
-            description = "a beautiful scene"
-        
-        # Generate captions for different styles
-        captions = [
-            {
-                "style": "casual",
-                "text": f"Just vibing with this {description}! Life's simple pleasures.",
-                "hashtags": ["#GoodVibes", "#InstaDaily", "#LifeIsGood"],
-                "emojis": ["😊", "✌️", "🌟"],
-                "formatting": "Add a line break after the caption text"
-            },
-            {
-                "style": "poetic",
-                "text": f"In the gentle whispers of {description}, I found a piece of my soul.",
-                "hashtags": ["#SoulfulMoments", "#Poetry", "#DeepThoughts"],
-                "emojis": ["🌹", "✨", "💫"],
-                "formatting": "Add a line break after each sentence"
-            },
-            {
-                "style": "humorous",
-                "text": f"When {description} is your therapy! No regrets, just good times.",
-                "hashtags": ["#NoFilter", "#JustForLaughs", "#WeekendVibes"],
-                "emojis": ["😂", "🤣", "🙌"],
-                "formatting": "Add emojis at the end of the caption"
-            }
-        ]
+        # Empty descriptions all get the same response, built once at import;
+        # callers get a copy so the shared one can't be edited
+        if not description or description.isspace():
+            return copy.deepcopy(DEFAULT_SUGGESTIONS)
         
-        return {"captions": captions}
\ No newline at end of file
+        return build_suggestions(description)
\ No newline at end of file
@@ -0,0 +1,40 @@
+"""
+Cache of recent successful password verifications.
+Password hashing is deliberately slow, so repeat logins with the same
+credentials skip it while the entry is fresh. Enabled with the
+USE_VERIFY_PASSWORD_CACHE config flag.
+"""
+import hashlib
+import threading
+from cachetools import TTLCache
+from flask import current_app
+
+_lock = threading.Lock()
+_verified = TTLCache(maxsize=2048, ttl=300)
+
+def _cache_key(user, password):
+    """Return the cache key for a user and submitted password."""
+    # The stored hash is part of the key so a password change never matches old entries
+    return hashlib.sha256(f"{user.id}:{user.password_hash}:{password}".encode()).digest()
+
+def check_password(user, password):
+    """Check a user's password, reusing a recent successful verification."""
+    if not current_app.config.get('USE_VERIFY_PASSWORD_CACHE'):
+        return user.check_password(password)
+
+    key = _cache_key(user, password)
+    with _lock:
+        if key in _verified:
+            return True
+
+    if not user.check_password(password):
+        return False
+
+    with _lock:
+        _verified[key] = True
+    return True
+
+def clear_password_cache():
+    """Forget all cached verifications."""
+    with _lock:
+        _verified.clear()
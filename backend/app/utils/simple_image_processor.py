@@ -2,7 +2,49 @@
 A simplified image processor that doesn't rely on external models.
 """
 import os
+import threading
+from cachetools import LRUCache
 from PIL import Image
+from app.utils.instagram_image import convert_to_instagram_size
+
+# Descriptions keyed by the image's path, mtime and size; they only depend on
+# the file's own pixels and dimensions
+_DESCRIPTION_CACHE = LRUCache(maxsize=1024)
+_DESCRIPTION_LOCK = threading.Lock()
+
+# Side of the square sample the dominant color is measured on
+COLOR_SAMPLE_SIZE = 64
+
+def classify_color(r, g, b):
+    """Return a simple descriptive name for an RGB color."""
+    if r > 200 and g > 200 and b > 200:
+        return "bright white"
+    elif r < 50 and g < 50 and b < 50:
+        return "dark black"
+    elif r > 200 and g < 100 and b < 100:
+        return "vibrant red"
+    elif r < 100 and g > 200 and b < 100:
+        return "vibrant green"
+    elif r < 100 and g < 100 and b > 200:
+        return "vibrant blue"
+    elif r > 200 and g > 200 and b < 100:
+        return "vibrant yellow"
+    elif r > 200 and g < 100 and b > 200:
+        return "vibrant purple"
+    elif r < 100 and g > 200 and b > 200:
+        return "vibrant cyan"
+    return "colorful"
+
+# classify_color evaluated once for the center of every bin the color sample is
+# quantized to (16 levels per channel), indexed by color_bin_index
+COLOR_NAMES = tuple(
+    classify_color(r + 8, g + 8, b + 8)
+    for r in range(0, 256, 16) for g in range(0, 256, 16) for b in range(0, 256, 16)
+)
+
+def color_bin_index(r, g, b):
+    """Return the COLOR_NAMES index of a color quantized with value & 0xF0."""
+    return (r << 4) | g | (b >> 4)
 
 class SimpleImageProcessor:
     """A simplified class for processing images without using ML models."""
@@ -10,13 +52,12 @@ class SimpleImageProcessor:
     def __init__(self, upload_folder):
         """Initialize the image processor with the upload folder."""
         self.upload_folder = upload_folder
+        # Create the upload folder once rather than on every save
+        os.makedirs(upload_folder, exist_ok=True)
     
     def save_image(self, image_file, filename):
         """Save the uploaded image to the upload folder."""
         try:
-            # Ensure the upload folder exists
-            os.makedirs(self.upload_folder, exist_ok=True)
-
             # Create the full path
             image_path = os.path.join(self.upload_folder, filename)
 
@@ -36,56 +77,44 @@ class SimpleImageProcessor:
         """
         try:
             # Check if the image exists
-            if not os.path.exists(image_path):
+            try:
+                st = os.stat(image_path)
+            except FileNotFoundError:
                 print(f"Image not found at path: {image_path}")
                 return "An image that could not be found"
 
-            # Open the image
-            image = Image.open(image_path)
-            
-            # Get basic image properties
-            width, height = image.size
-            format_name = image.format
-            mode = image.mode
-            
-            # Analyze image colors
-            try:
-                # Get the dominant colors if possible
-                colors = image.getcolors(maxcolors=256)
-                if colors:
-                    # Sort colors by count (most frequent first)
-                    colors.sort(reverse=True, key=lambda x: x[0])
-                    # Get the RGB values of the most frequent color
-                    most_frequent_color = colors[0][1]
-                    if isinstance(most_frequent_color, tuple) and len(most_frequent_color) >= 3:
-                        r, g, b = most_frequent_color[:3]
-                        # Simple color classification
-                        if r > 200 and g > 200 and b > 200:
-                            color_desc = "bright white"
-                        elif r < 50 and g < 50 and b < 50:
-                            color_desc = "dark black"
-                        elif r > 200 and g < 100 and b < 100:
-                            color_desc = "vibrant red"
-                        elif r < 100 and g > 200 and b < 100:
-                            color_desc = "vibrant green"
-                        elif r < 100 and g < 100 and b > 200:
-                            color_desc = "vibrant blue"
-                        elif r > 200 and g > 200 and b < 100:
-                            color_desc = "vibrant yellow"
-                        elif r > 200 and g < 100 and b > 200:
-                            color_desc = "vibrant purple"
-                        elif r < 100 and g > 200 and b > 200:
-                            color_desc = "vibrant cyan"
-                        else:
-                            color_desc = "colorful"
-                    else:
-                        color_desc = "colorful"
-                else:
+            # Reuse the description of the same, unmodified file
+            key = (os.path.abspath(image_path), st.st_mtime_ns, st.st_size)
+            with _DESCRIPTION_LOCK:
+                description = _DESCRIPTION_CACHE.get(key)
+            if description is not None:
+                return description
+
+            # Open the image; the with block closes the file and drops the decoded
+            # pixels as soon as the color sample has been taken
+            with Image.open(image_path) as image:
+
+                # Get basic image properties
+                width, height = image.size
+                format_name = image.format
+                mode = image.mode
+
+                # Analyze image colors
+                try:
+                    # Find the dominant color on a 64x64 sample with each channel
+                    # reduced to 16 levels; 4096 pixels can't exceed maxcolors, so
+                    # getcolors always returns a histogram even for photos
+                    image.draft('RGB', (COLOR_SAMPLE_SIZE, COLOR_SAMPLE_SIZE))
+                    sample = image.resize((COLOR_SAMPLE_SIZE, COLOR_SAMPLE_SIZE), Image.NEAREST).convert('RGB')
+                    colors = sample.point(lambda value: value & 0xF0).getcolors(maxcolors=COLOR_SAMPLE_SIZE ** 2)
+
+                    # Name the most frequent bin from the table built at import
+                    r, g, b = max(colors, key=lambda x: x[0])[1]
+                    color_desc = COLOR_NAMES[color_bin_index(r, g, b)]
+                except Exception as e:
+                    print(f"Error analyzing colors: {e}")
                     color_desc = "colorful"
-            except Exception as e:
-                print(f"Error analyzing colors: {e}")
-                color_desc = "colorful"
-            
+
             # Determine image type based on aspect ratio
             aspect_ratio = width / height
             if 0.9 <= aspect_ratio <= 1.1:
@@ -109,6 +138,8 @@ class SimpleImageProcessor:
                 description += f" with resolution {width}x{height}"
             
             print(f"Generated simple image description: {description}")
+            with _DESCRIPTION_LOCK:
+                _DESCRIPTION_CACHE[key] = description
             return description
         except Exception as e:
             print(f"Error generating simple image description: {e}")
@@ -117,38 +148,6 @@ class SimpleImageProcessor:
     def convert_to_instagram_size(self, image_path):
         """
         Convert the given image to an Instagram-compatible size by center-cropping it to a square
-        and resizing to 1080x1080.
+        and resizing to 1080x1080. The shared converter used by the Instagram posters does the work.
         """
-        try:
-            # Open the image
-            image = Image.open(image_path)
-            
-            # Get the image dimensions
-            width, height = image.size
-            
-            # Determine the smaller dimension for a center crop
-            min_dim = min(width, height)
-            left = (width - min_dim) // 2
-            top = (height - min_dim) // 2
-            right = left + min_dim
-            bottom = top + min_dim
-            
-            # Crop the image to a square
-            image_cropped = image.crop((left, top, right, bottom))
-            
-            # Resize to 1080x1080 pixels using LANCZOS resampling filter
-            image_resized = image_cropped.resize((1080, 1080), resample=Image.LANCZOS)
-            
-            # Generate a new filename for the converted image
-            filename = os.path.basename(image_path)
-            name, ext = os.path.splitext(filename)
-            new_filename = f"{name}_instagram{ext}"
-            new_path = os.path.join(self.upload_folder, new_filename)
-            
-            # Save the resized image
-            image_resized.save(new_path)
-            
-            return new_path
-        except Exception as e:
-            print(f"Error converting image to Instagram size: {e}")
-            return image_path
\ No newline at end of file
+        return convert_to_instagram_size(image_path)
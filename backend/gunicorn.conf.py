@@ -0,0 +1,22 @@
+"""
+Gunicorn configuration.
+Threaded workers let one process serve several captioning requests while
+BLIP and Cohere calls run on the application thread pool. The app is loaded
+once in the master so one-time setup is shared by the forked workers.
+Files returned with send_file() are copied to the socket with sendfile(2).
+"""
+bind = "0.0.0.0:5000"
+workers = 2
+worker_class = "gthread"
+threads = 16
+timeout = 180
+preload_app = True
+sendfile = True
+
+# The master loads the app without starting the BLIP load (see post_fork)
+raw_env = ["BLIP_WARM_UP=false"]
+
+def post_fork(server, worker):
+    """Start loading BLIP in each worker once it has been forked."""
+    from app.utils.blip_image_processor import warm_up
+    warm_up()
@@ -0,0 +1,106 @@
+"""
+Instagram posting worker.
+Runs in the posting child processes started by app.utils.direct_instagram_poster;
+the session and login helpers are also used by app.utils.simple_instagram_poster.
+It lives outside the app package so the forkserver that preloads it doesn't
+import the Flask app, torch or transformers; keep its imports to the standard
+library and instabot.
+"""
+
+import os
+import logging
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+# instabot's default base_path; posting processes for every user share it
+CONFIG_DIR = os.path.join(os.getcwd(), 'config')
+
+def session_file(username):
+    """Return the path of the cookie file instabot saves for username."""
+    return os.path.join(CONFIG_DIR, f"{username}_uuid_and_cookie.json")
+
+def clean_session_file(username):
+    """Remove the saved session of one user, leaving other users' sessions alone."""
+    try:
+        path = session_file(username)
+        os.remove(path)
+        logger.info(f"Removed saved session: {path}")
+    except FileNotFoundError:
+        pass
+    except Exception as e:
+        logger.error(f"Error cleaning session files: {e}")
+
+def _clean_remove_me_files(image_path):
+    """Clean up any existing .REMOVE_ME files to prevent conflicts"""
+    try:
+        remove_me_path = f"{image_path}.REMOVE_ME"
+        os.remove(remove_me_path)
+        logger.info(f"Removed existing .REMOVE_ME file: {remove_me_path}")
+    except FileNotFoundError:
+        pass
+    except Exception as e:
+        logger.error(f"Error cleaning .REMOVE_ME files: {e}")
+
+def login(username, password):
+    """
+    Log in with instabot and return the bot, or None if login fails.
+    The session saved in the config directory is tried first; if Instagram
+    rejects it, that user's session file is removed and a fresh login is made
+    once. Without a saved session a failed login isn't retried, as repeated
+    logins risk locking the account.
+    """
+    from instabot import Bot
+
+    logger.info(f"Logging in as {username}")
+    had_session = os.path.exists(session_file(username))
+    bot = Bot()
+    if bot.login(username=username, password=password):
+        return bot
+    if not had_session:
+        return None
+
+    logger.info("Saved session was rejected, logging in again")
+    clean_session_file(username)
+    bot = Bot()
+    if bot.login(username=username, password=password):
+        return bot
+    return None
+
+def _post_with_instabot(image_path, caption, username, password):
+    """Log in and upload the photo with instabot, returning True on success."""
+    try:
+        # Clean up any existing .REMOVE_ME files to prevent conflicts
+        _clean_remove_me_files(image_path)
+
+        # Log in, reusing the session saved by an earlier post when it's still
+        # valid. Each post runs in a new process, so the saved cookie is what
+        # carries a user's session from one post to the next; within the post,
+        # login and upload share the bot's requests.Session and its connections
+        bot = login(username, password)
+        if bot is None:
+            logger.error("Failed to login to Instagram")
+            return False
+
+        # Upload the photo
+        logger.info(f"Uploading photo: {image_path}")
+        upload_success = bot.upload_photo(image_path, caption=caption)
+
+        if upload_success:
+            logger.info("Successfully posted to Instagram")
+            return True
+        else:
+            logger.error("Failed to upload photo to Instagram")
+            return False
+    except Exception as e:
+        logger.error(f"Error posting to Instagram: {e}")
+        # Handle the specific file rename error
+        if "Cannot create a file when that file already exists" in str(e) and ".REMOVE_ME" in str(e):
+            logger.info("Post was likely successful despite the .REMOVE_ME file error")
+            return True
+        return False
+
+def instagram_post_worker(image_path, caption, username, password):
+    """Child process entry point; the exit code reports whether the post succeeded."""
+    success = _post_with_instabot(image_path, caption, username, password)
+    raise SystemExit(0 if success else 1)